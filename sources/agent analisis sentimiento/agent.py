@@ -4,14 +4,38 @@ Un asistente sofisticado para análisis de sentimientos en español usando Googl
 """
 
 from google.adk.agents import Agent
+from google.adk.tools.tool_context import ToolContext
 from google.genai import types
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, List, Dict, Iterable, Iterator, Optional, Tuple, Union
 from dataclasses import dataclass, field
 from datetime import datetime
+import atexit
+import contextlib
+import csv
+import functools
+import gzip
+import hashlib
+import heapq
 import json
 import logging
+import math
+import mmap
+import multiprocessing
+import os
 import re
-from collections import Counter
+import sqlite3
+import struct
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+try:
+    import numpy as np
+except ImportError:  # el análisis por lotes cae a Python puro
+    np = None
 
 # -------------------------
 # Configuración
@@ -39,29 +63,126 @@ class AnalisisResultado:
     estadisticas: Dict[str, int]
     timestamp: datetime = field(default_factory=datetime.now)
 
-@dataclass
+CAPACIDAD_HISTORIAL = 1000  # análisis recientes que se conservan
+LONGITUD_EXTRACTO = 60  # caracteres del texto que se guardan en el historial
+
+class RegistroAnalisis:
+    """Entrada compacta del historial: extracto del texto y resultado, sin listas."""
+    __slots__ = ("extracto", "sentimiento", "confianza", "puntuacion", "num_palabras_clave", "timestamp")
+    
+    def __init__(self, extracto: str, sentimiento: str, confianza: float, puntuacion: float,
+                 num_palabras_clave: int, timestamp: float):
+        self.extracto = extracto
+        self.sentimiento = sentimiento
+        self.confianza = confianza
+        self.puntuacion = puntuacion
+        self.num_palabras_clave = num_palabras_clave
+        self.timestamp = timestamp  # segundos desde epoch
+    
+    @classmethod
+    def desde_resultado(cls, resultado: AnalisisResultado) -> "RegistroAnalisis":
+        texto = resultado.texto_original
+        return cls(
+            texto[:LONGITUD_EXTRACTO] + "..." if len(texto) > LONGITUD_EXTRACTO else texto,
+            resultado.sentimiento,
+            resultado.confianza,
+            resultado.puntuacion,
+            len(resultado.palabras_clave),
+            resultado.timestamp.timestamp(),
+        )
+
 class HistorialAnalisis:
-    """Historial de análisis realizados."""
-    analisis: List[AnalisisResultado] = field(default_factory=list)
+    """
+    Historial de análisis en un buffer circular de capacidad fija.
+    
+    Los análisis más antiguos se sobrescriben al llenarse; la distribución y
+    la confianza promedio se mantienen de forma incremental sobre todos los
+    análisis desde la última limpieza, así que las estadísticas globales
+    cuestan O(1) y la memoria no crece con el tiempo. Con un `almacen`, cada
+    análisis se guarda además en SQLite (marcado con `sesion`) y las
+    estadísticas salen de ahí.
+    
+    Con `agregados`, las palabras clave alimentan además `palabras`, con las
+    más frecuentes por hora y por día, y cada resultado `tendencias`, con
+    los totales por minuto, hora y día. Todas las operaciones toman el lock
+    del propio historial.
+    """
+    
+    def __init__(self, capacidad: int = CAPACIDAD_HISTORIAL, almacen: Optional["AlmacenHistorial"] = None,
+                 sesion: Optional[str] = None, agregados: bool = True):
+        self.capacidad = capacidad
+        self.almacen = almacen
+        self.sesion = sesion
+        self.agregados = agregados
+        self._lock = threading.Lock()
+        self._reiniciar()
+    
+    def __len__(self) -> int:
+        """Análisis conservados en el buffer."""
+        return min(self.total, self.capacidad)
     
     def agregar(self, resultado: AnalisisResultado):
         """Agrega un nuevo análisis al historial."""
-        self.analisis.append(resultado)
+        registro = RegistroAnalisis.desde_resultado(resultado)
+        if self.almacen is not None:
+            self.almacen.agregar(registro, self.sesion or "")
+        with self._lock:
+            self._registros[self.total % self.capacidad] = registro
+            self.total += 1
+            self.distribucion[resultado.sentimiento] += 1
+            self.suma_confianza += resultado.confianza
+            self.ultimo_timestamp = resultado.timestamp
+            if self.agregados:
+                self.palabras.agregar(resultado.palabras_clave, registro.timestamp)
+                self.tendencias.agregar(resultado.sentimiento, resultado.confianza, registro.timestamp)
+    
+    def recientes(self, limite: Optional[int] = None) -> List[RegistroAnalisis]:
+        """Devuelve los últimos análisis, del más reciente al más antiguo."""
+        with self._lock:
+            cantidad = len(self) if not limite else min(limite, len(self))
+            return [self._registros[(self.total - 1 - i) % self.capacidad] for i in range(cantidad)]
+    
+    def limpiar(self) -> int:
+        """Vacía el historial y sus estadísticas; devuelve cuántos análisis había."""
+        with self._lock:
+            eliminados = self.total
+            if self.almacen is not None:
+                eliminados = self.almacen.limpiar(self.sesion)
+            self._reiniciar()
+        return eliminados
+    
+    def _reiniciar(self):
+        self._registros: List[Optional[RegistroAnalisis]] = [None] * self.capacidad
+        self.total = 0
+        self.distribucion = Counter()
+        self.suma_confianza = 0.0
+        self.ultimo_timestamp: Optional[datetime] = None
+        self.palabras = PalabrasFrecuentes() if self.agregados else None
+        self.tendencias = TendenciasSentimiento() if self.agregados else None
+    
+    def mas_frecuentes(self, periodo: str, limite: int) -> Dict[str, any]:
+        with self._lock:
+            return self.palabras.mas_frecuentes(periodo, limite)
+    
+    def tendencia(self, segundos: float, resolucion: Optional[str] = None) -> Dict[str, any]:
+        with self._lock:
+            return self.tendencias.resumen(segundos, resolucion)
     
     def obtener_estadisticas_globales(self) -> Dict[str, any]:
-        """Obtiene estadísticas del historial completo."""
-        if not self.analisis:
-            return {"total": 0}
-        
-        sentimientos = [a.sentimiento for a in self.analisis]
-        confianzas = [a.confianza for a in self.analisis]
-        
-        return {
-            "total_analisis": len(self.analisis),
-            "distribucion_sentimientos": dict(Counter(sentimientos)),
-            "confianza_promedio": sum(confianzas) / len(confianzas),
-            "ultimo_analisis": self.analisis[-1].timestamp.isoformat()
-        }
+        """Obtiene estadísticas de todos los análisis desde la última limpieza."""
+        if self.almacen is not None:
+            return self.almacen.estadisticas_globales(self.sesion)
+        with self._lock:
+            if not self.total:
+                return {"total": 0}
+            
+            return {
+                "total_analisis": self.total,
+                "distribucion_sentimientos": dict(self.distribucion),
+                "confianza_promedio": self.suma_confianza / self.total,
+                "ultimo_analisis": self.ultimo_timestamp.isoformat(),
+                "en_historial": len(self)
+            }
 
 # -------------------------
 # Diccionarios de Palabras
@@ -132,11 +253,597 @@ MODIFICADORES = {
     "no": -1.0, "nunca": -1.2, "jamás": -1.2, "nada": -1.1, "sin": -0.8
 }
 
+# Emociones específicas para analizar_emociones_avanzado
+EMOCIONES = {
+    "alegría": ["feliz", "alegre", "contento", "eufórico", "radiante", "jubiloso"],
+    "tristeza": ["triste", "deprimido", "melancólico", "desanimado", "abatido"],
+    "enojo": ["enojado", "furioso", "iracundo", "molesto", "irritado", "indignado"],
+    "miedo": ["miedo", "temor", "pánico", "terror", "asustado", "atemorizado"],
+    "sorpresa": ["sorprendido", "asombrado", "impactado", "atónito", "pasmado"],
+    "disgusto": ["asco", "repugnancia", "aversión", "disgusto", "náusea"]
+}
+
+# -------------------------
+# Persistencia del Historial
+# -------------------------
+
+# Directorio de datos del usuario ($XDG_DATA_HOME, %LOCALAPPDATA% o ~/.local/share)
+DIRECTORIO_DATOS = os.path.join(
+    os.getenv("XDG_DATA_HOME") or os.getenv("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".local", "share"),
+    "agente_sentimiento",
+)
+# Base de datos del historial; SENTIMIENTO_HISTORIAL_DB="" lo deja solo en memoria
+RUTA_HISTORIAL_DB = os.getenv("SENTIMIENTO_HISTORIAL_DB", os.path.join(DIRECTORIO_DATOS, "historial_sentimientos.db"))
+LOTE_ESCRITURA_HISTORIAL = 200  # análisis por transacción
+INTERVALO_ESCRITURA_HISTORIAL = 1.0  # segundos máximos que un análisis espera a escribirse
+
+AGRUPACIONES_HISTORIAL = {"hora": "%Y-%m-%d %H:00", "dia": "%Y-%m-%d"}
+
+# Bases creadas antes del historial por sesión no tienen la columna `sesion`
+MIGRACION_SESION_HISTORIAL = "ALTER TABLE analisis ADD COLUMN sesion TEXT NOT NULL DEFAULT ''"
+INDICE_SESION_HISTORIAL = "CREATE INDEX IF NOT EXISTS idx_analisis_sesion ON analisis(sesion, timestamp)"
+
+ESQUEMA_HISTORIAL = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+CREATE TABLE IF NOT EXISTS analisis (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    sentimiento TEXT NOT NULL,
+    confianza REAL NOT NULL,
+    puntuacion REAL NOT NULL,
+    num_palabras_clave INTEGER NOT NULL,
+    extracto TEXT NOT NULL,
+    sesion TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_analisis_timestamp ON analisis(timestamp);
+CREATE INDEX IF NOT EXISTS idx_analisis_sentimiento ON analisis(sentimiento, timestamp);
+-- Totales por sentimiento de versiones anteriores; ninguna consulta los usaba
+DROP TABLE IF EXISTS resumen;
+"""
+
+class AlmacenHistorial:
+    """
+    Historial persistente en SQLite (modo WAL).
+    
+    Las inserciones se acumulan y se escriben por lotes en una transacción.
+    Las consultas por rango y por hora/día usan el índice de timestamp y
+    agregan en SQL. Cada análisis lleva la sesión que lo hizo; las consultas
+    con `sesion` se limitan a ella (índice por sesión y timestamp).
+    
+    `agregar` solo añade la fila a la cola bajo un lock propio; escribe un
+    hilo de fondo, al completarse un lote o como mucho
+    INTERVALO_ESCRITURA_HISTORIAL segundos después del primer análisis
+    pendiente, y cada consulta escribe antes lo pendiente. Así quien agrega
+    nunca espera a SQLite.
+    """
+    
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()  # conexión; se toma antes que el de la cola
+        self._hay_pendientes = threading.Condition(threading.Lock())  # cola de pendientes
+        self._pendientes: List[tuple] = []
+        self._primer_pendiente = 0.0  # time.monotonic() del análisis más antiguo sin escribir
+        self._cerrado = False
+        with self._lock:
+            self._conexion.executescript(ESQUEMA_HISTORIAL)
+            columnas = {fila[1] for fila in self._conexion.execute("PRAGMA table_info(analisis)")}
+            if "sesion" not in columnas:
+                self._conexion.execute(MIGRACION_SESION_HISTORIAL)
+            self._conexion.execute(INDICE_SESION_HISTORIAL)
+        threading.Thread(target=self._escritor, name="historial-sqlite", daemon=True).start()
+        atexit.register(self.cerrar)
+    
+    def agregar(self, registro: RegistroAnalisis, sesion: str = ""):
+        """Encola un análisis; el hilo de fondo lo escribe al completar un lote o pasado el intervalo."""
+        fila = (
+            registro.timestamp, registro.sentimiento, registro.confianza,
+            registro.puntuacion, registro.num_palabras_clave, registro.extracto, sesion,
+        )
+        with self._hay_pendientes:
+            if not self._pendientes:
+                self._primer_pendiente = time.monotonic()
+            self._pendientes.append(fila)
+            if len(self._pendientes) in (1, LOTE_ESCRITURA_HISTORIAL):
+                self._hay_pendientes.notify()
+    
+    def _escritor(self):
+        # Hilo de fondo: espera a un lote completo o al intervalo y escribe sin tomar la cola
+        while True:
+            with self._hay_pendientes:
+                while True:
+                    if self._cerrado:
+                        return
+                    if not self._pendientes:
+                        self._hay_pendientes.wait()
+                        continue
+                    espera = self._primer_pendiente + INTERVALO_ESCRITURA_HISTORIAL - time.monotonic()
+                    if espera <= 0 or len(self._pendientes) >= LOTE_ESCRITURA_HISTORIAL:
+                        break
+                    self._hay_pendientes.wait(espera)
+            try:
+                with self._lock:
+                    self._escribir_pendientes()
+            except sqlite3.Error as error:
+                logger.warning(f"⚠️ No se pudo escribir el historial ({error}); se reintenta")
+                time.sleep(INTERVALO_ESCRITURA_HISTORIAL)
+    
+    def _escribir_pendientes(self):
+        # Se llama con el lock de la conexión tomado; la cola solo se bloquea para vaciarla
+        with self._hay_pendientes:
+            lote, self._pendientes = self._pendientes, []
+        if not lote or self._conexion is None:
+            return
+        try:
+            self._insertar(lote)
+        except sqlite3.Error:
+            with self._hay_pendientes:
+                self._pendientes[:0] = lote
+                self._primer_pendiente = time.monotonic()
+            raise
+    
+    def _insertar(self, lote: List[tuple]):
+        with self._conexion:
+            self._conexion.execute("BEGIN")
+            self._conexion.executemany(
+                "INSERT INTO analisis (timestamp, sentimiento, confianza, puntuacion, num_palabras_clave, extracto, sesion) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                lote,
+            )
+    
+    def _consultar(self, sql: str, parametros: tuple = ()) -> List[tuple]:
+        with self._lock:
+            self._escribir_pendientes()
+            return self._conexion.execute(sql, parametros).fetchall()
+    
+    @staticmethod
+    def _filtro(desde: Optional[float], hasta: Optional[float], sesion: Optional[str]) -> Tuple[str, tuple]:
+        condicion = "timestamp >= ? AND timestamp < ?"
+        parametros = (desde if desde is not None else float("-inf"), hasta if hasta is not None else float("inf"))
+        if sesion is not None:
+            condicion = f"sesion = ? AND {condicion}"
+            parametros = (sesion, *parametros)
+        return condicion, parametros
+    
+    def recientes(self, limite: Optional[int] = None, desde: Optional[float] = None,
+                  hasta: Optional[float] = None, sesion: Optional[str] = None) -> List[RegistroAnalisis]:
+        """Últimos análisis (del más reciente al más antiguo), opcionalmente en [desde, hasta) y de una sesión."""
+        condicion, parametros = self._filtro(desde, hasta, sesion)
+        filas = self._consultar(
+            "SELECT extracto, sentimiento, confianza, puntuacion, num_palabras_clave, timestamp "
+            f"FROM analisis WHERE {condicion} ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (*parametros, limite or -1),
+        )
+        return [RegistroAnalisis(*fila) for fila in filas]
+    
+    def agregados(self, agrupar_por: Optional[str] = None, desde: Optional[float] = None,
+                  hasta: Optional[float] = None, sesion: Optional[str] = None) -> List[Dict[str, any]]:
+        """
+        Distribución y confianza promedio en [desde, hasta), en total o por periodo.
+        
+        Args:
+            agrupar_por: "hora", "dia" o None para un único total
+            desde: Timestamp inicial (incluido)
+            hasta: Timestamp final (excluido)
+            sesion: Solo los análisis de esta sesión, opcional
+            
+        Returns:
+            Lista de {"periodo", "total", "distribucion_sentimientos", "confianza_promedio"}
+        """
+        periodo = "'total'"
+        if agrupar_por is not None:
+            periodo = f"strftime('{AGRUPACIONES_HISTORIAL[agrupar_por]}', timestamp, 'unixepoch', 'localtime')"
+        condicion, parametros = self._filtro(desde, hasta, sesion)
+        filas = self._consultar(
+            f"SELECT {periodo} AS periodo, sentimiento, COUNT(*), SUM(confianza) FROM analisis "
+            f"WHERE {condicion} GROUP BY periodo, sentimiento ORDER BY periodo",
+            parametros,
+        )
+        periodos = {}
+        for nombre, sentimiento, total, suma in filas:
+            fila = periodos.setdefault(nombre, {"periodo": nombre, "total": 0, "distribucion_sentimientos": {}, "suma": 0.0})
+            fila["total"] += total
+            fila["distribucion_sentimientos"][sentimiento] = total
+            fila["suma"] += suma
+        for fila in periodos.values():
+            fila["confianza_promedio"] = round(fila.pop("suma") / fila["total"], 3)
+        return list(periodos.values())
+    
+    def estadisticas_globales(self, sesion: Optional[str] = None) -> Dict[str, any]:
+        """
+        Mismo formato que HistorialAnalisis.obtener_estadisticas_globales, de
+        todos los análisis o, con `sesion`, de los de esa sesión.
+        """
+        condicion, parametros = self._filtro(None, None, sesion)
+        filas = self._consultar(
+            "SELECT sentimiento, COUNT(*), SUM(confianza), MAX(timestamp) FROM analisis "
+            f"WHERE {condicion} GROUP BY sentimiento",
+            parametros,
+        )
+        total = sum(fila[1] for fila in filas)
+        if not total:
+            return {"total": 0}
+        return {
+            "total_analisis": total,
+            "distribucion_sentimientos": {fila[0]: fila[1] for fila in filas},
+            "confianza_promedio": sum(fila[2] for fila in filas) / total,
+            "ultimo_analisis": datetime.fromtimestamp(max(fila[3] for fila in filas)).isoformat(),
+            "en_historial": total
+        }
+    
+    def limpiar(self, sesion: Optional[str] = None) -> int:
+        """
+        Borra todos los análisis o, con `sesion`, solo los de esa sesión;
+        devuelve cuántos se borraron.
+        """
+        with self._lock:
+            self._escribir_pendientes()
+            if sesion is None:
+                return self._conexion.execute("DELETE FROM analisis").rowcount
+            return self._conexion.execute("DELETE FROM analisis WHERE sesion = ?", (sesion,)).rowcount
+    
+    def cerrar(self):
+        """Escribe lo pendiente y cierra la conexión."""
+        with self._lock:
+            if self._conexion is None:
+                return
+            self._escribir_pendientes()
+            self._conexion.close()
+            self._conexion = None
+        with self._hay_pendientes:
+            self._cerrado = True
+            self._hay_pendientes.notify()
+
+def _abrir_almacen(ruta: Optional[str] = RUTA_HISTORIAL_DB) -> Optional[AlmacenHistorial]:
+    if not ruta:
+        return None
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        return AlmacenHistorial(ruta)
+    except (OSError, sqlite3.Error) as error:
+        logger.warning(f"⚠️ Historial persistente no disponible ({error}); se usa solo memoria")
+        return None
+
+# -------------------------
+# Palabras Frecuentes
+# -------------------------
+
+ANCHO_SKETCH = 1024  # contadores por fila del Count-Min sketch
+PROFUNDIDAD_SKETCH = 4  # filas, cada una con su función hash
+CANDIDATAS_FRECUENTES = 50  # palabras más frecuentes que se siguen por polaridad y ventana
+# periodo -> (segundos por ventana, ventanas que cubre)
+PERIODOS_PALABRAS = {"hora": (300, 12), "dia": (3600, 24)}
+
+@functools.lru_cache(maxsize=1 << 16)  # las palabras clave salen de un léxico acotado
+def _celdas_sketch(clave: str) -> Tuple[int, ...]:
+    """Celda de la palabra en cada fila del sketch (doble hashing sobre hash()), como índice plano."""
+    h = hash(clave)
+    h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+    return tuple(fila * ANCHO_SKETCH + (h1 + fila * h2) % ANCHO_SKETCH for fila in range(PROFUNDIDAD_SKETCH))
+
+class CountMinSketch:
+    """
+    Conteo aproximado de palabras en memoria fija.
+    
+    Cada palabra suma en una celda por fila (_celdas_sketch) y su estimación
+    es el mínimo de esas celdas: nunca queda por debajo del valor real y,
+    con alta probabilidad, lo supera como mucho en e/ANCHO_SKETCH del total
+    contado.
+    """
+    __slots__ = ("contadores", "total")
+    
+    def __init__(self):
+        self.contadores = array("q", bytes(8 * ANCHO_SKETCH * PROFUNDIDAD_SKETCH))  # filas una tras otra
+        self.total = 0
+    
+    def agregar(self, conteo: Dict[str, int]) -> Iterator[Tuple[str, int]]:
+        """Suma las apariciones de cada palabra y entrega (palabra, nueva estimación)."""
+        contadores = self.contadores
+        for clave, cantidad in conteo.items():
+            celdas = _celdas_sketch(clave)
+            for celda in celdas:
+                contadores[celda] += cantidad
+            self.total += cantidad
+            yield clave, min(map(contadores.__getitem__, celdas))
+
+class VentanaPalabras:
+    """Sketch de un intervalo de tiempo y sus palabras más frecuentes por polaridad."""
+    __slots__ = ("clave", "sketch", "candidatas", "montones")
+    
+    def __init__(self, clave: int):
+        self.clave = clave  # timestamp // duración de la ventana
+        self.sketch = CountMinSketch()
+        self.candidatas = {"positivas": {}, "negativas": {}}  # palabra -> estimación
+        # Montículo de mínimos (estimación, palabra) por polaridad; una entrada
+        # por candidata, que puede haberse quedado atrás de su estimación
+        self.montones = {"positivas": [], "negativas": []}
+    
+    def agregar(self, conteo: Dict[str, int]):
+        """Cuenta las palabras clave ("+palabra"/"-palabra") y actualiza las candidatas."""
+        for clave, estimacion in self.sketch.agregar(conteo):
+            palabra = clave[1:]
+            polaridad = "positivas" if clave[0] == "+" else "negativas"
+            if palabra in self.candidatas[polaridad]:
+                self.candidatas[polaridad][palabra] = estimacion
+            else:
+                self._proponer(polaridad, palabra, estimacion)
+    
+    def _proponer(self, polaridad: str, palabra: str, estimacion: int):
+        candidatas = self.candidatas[polaridad]
+        monton = self.montones[polaridad]
+        if len(candidatas) < CANDIDATAS_FRECUENTES:
+            candidatas[palabra] = estimacion
+            heapq.heappush(monton, (estimacion, palabra))
+        else:
+            # Actualizar las entradas atrasadas hasta que la cima sea la mínima real
+            while monton[0][0] != candidatas[monton[0][1]]:
+                heapq.heapreplace(monton, (candidatas[monton[0][1]], monton[0][1]))
+            if estimacion > monton[0][0]:
+                _, saliente = heapq.heapreplace(monton, (estimacion, palabra))
+                del candidatas[saliente]
+                candidatas[palabra] = estimacion
+
+class PalabrasFrecuentes:
+    """
+    Palabras clave positivas y negativas más frecuentes de la última hora o
+    del último día, en memoria y tiempo constantes.
+    
+    Cada periodo es un anillo de ventanas (12 de 5 minutos para la hora, 24
+    de una hora para el día) con un Count-Min sketch y un montículo de
+    candidatas; las ventanas viejas se reutilizan al avanzar el reloj. Una
+    consulta suma las celdas de las ventanas vigentes solo para las
+    candidatas, sin recorrer el historial. Los conteos son aproximados (por
+    exceso) y no se persisten: cubren lo analizado desde el arranque.
+    """
+    
+    def __init__(self, periodos: Dict[str, Tuple[int, int]] = PERIODOS_PALABRAS):
+        self.periodos = periodos
+        self._anillos = {periodo: [None] * cantidad for periodo, (_, cantidad) in periodos.items()}
+    
+    def _ventana(self, periodo: str, timestamp: float) -> Optional[VentanaPalabras]:
+        duracion, cantidad = self.periodos[periodo]
+        clave = int(timestamp // duracion)
+        anillo = self._anillos[periodo]
+        ventana = anillo[clave % cantidad]
+        if ventana is None or ventana.clave < clave:
+            ventana = anillo[clave % cantidad] = VentanaPalabras(clave)
+        elif ventana.clave > clave:
+            return None  # análisis más antiguo que todo el periodo
+        return ventana
+    
+    def agregar(self, palabras_clave: List[str], timestamp: float):
+        """Cuenta las palabras clave ("+palabra"/"-palabra") de un análisis."""
+        if not palabras_clave:
+            return
+        conteo = Counter(palabras_clave)
+        for periodo in self.periodos:
+            ventana = self._ventana(periodo, timestamp)
+            if ventana is not None:
+                ventana.agregar(conteo)
+    
+    def mas_frecuentes(self, periodo: str = "hora", limite: int = 10,
+                       ahora: Optional[float] = None) -> Dict[str, any]:
+        """
+        Palabras más frecuentes del periodo por polaridad.
+        
+        Returns:
+            Diccionario con "positivas" y "negativas" (listas de (palabra,
+            apariciones estimadas)) y "total_apariciones" del periodo
+        """
+        duracion, cantidad = self.periodos[periodo]
+        actual = int((time.time() if ahora is None else ahora) // duracion)
+        vigentes = [v for v in self._anillos[periodo] if v is not None and actual - cantidad < v.clave <= actual]
+        resultado = {"total_apariciones": sum(v.sketch.total for v in vigentes)}
+        for polaridad, signo in (("positivas", "+"), ("negativas", "-")):
+            estimadas = []
+            for palabra in set().union(*(v.candidatas[polaridad] for v in vigentes)):
+                celdas = _celdas_sketch(signo + palabra)
+                estimadas.append((palabra, min(sum(v.sketch.contadores[celda] for v in vigentes) for celda in celdas)))
+            estimadas.sort(key=lambda par: (-par[1], par[0]))
+            resultado[polaridad] = estimadas[:limite]
+        return resultado
+
+# -------------------------
+# Tendencias
+# -------------------------
+
+# resolución -> (segundos por cubeta, cubetas que se conservan)
+RESOLUCIONES_TENDENCIA = {"minuto": (60, 1440), "hora": (3600, 168), "dia": (86400, 90)}
+MAX_PUNTOS_TENDENCIA = 60  # puntos de la serie; si hay más cubetas se agrupan consecutivas
+
+class CubetaTendencia:
+    """Totales de los análisis de un intervalo de tiempo."""
+    __slots__ = ("clave", "distribucion", "suma_confianza")
+    
+    def __init__(self, clave: int):
+        self.clave = clave  # timestamp // segundos de la cubeta
+        self.distribucion = Counter()
+        self.suma_confianza = 0.0
+
+class TendenciasSentimiento:
+    """
+    Distribución de sentimientos y confianza promedio por minuto, hora y día.
+    
+    Cada resolución es un anillo de cubetas que se actualiza en O(1) por
+    análisis y se reutiliza al avanzar el reloj (1 día de minutos, 1 semana
+    de horas, 90 días). Una consulta como "los últimos 15 minutos" suma
+    solo las cubetas de esa ventana, sin recorrer el historial; la cubeta
+    actual cuenta aunque esté a medias. La serie que se devuelve tiene como
+    mucho MAX_PUNTOS_TENDENCIA puntos.
+    """
+    
+    def __init__(self, resoluciones: Dict[str, Tuple[int, int]] = RESOLUCIONES_TENDENCIA):
+        self.resoluciones = resoluciones
+        self._anillos = {nombre: [None] * cantidad for nombre, (_, cantidad) in resoluciones.items()}
+    
+    def agregar(self, sentimiento: str, confianza: float, timestamp: float):
+        for nombre, (duracion, cantidad) in self.resoluciones.items():
+            clave = int(timestamp // duracion)
+            anillo = self._anillos[nombre]
+            cubeta = anillo[clave % cantidad]
+            if cubeta is None or cubeta.clave < clave:
+                cubeta = anillo[clave % cantidad] = CubetaTendencia(clave)
+            elif cubeta.clave > clave:
+                continue  # más antiguo que lo que conserva esta resolución
+            cubeta.distribucion[sentimiento] += 1
+            cubeta.suma_confianza += confianza
+    
+    def resolucion_para(self, segundos: float, max_puntos: Optional[int] = None) -> Optional[str]:
+        """La resolución más fina que cubre `segundos` hacia atrás (con como mucho `max_puntos` cubetas)."""
+        for nombre, (duracion, cantidad) in sorted(self.resoluciones.items(), key=lambda r: r[1][0]):
+            cubetas = math.ceil(segundos / duracion)
+            if cubetas <= cantidad and (max_puntos is None or cubetas <= max_puntos):
+                return nombre
+        return None
+    
+    def serie(self, resolucion: str, cubetas: int, ahora: Optional[float] = None) -> List[Tuple[int, Optional[CubetaTendencia]]]:
+        """Las últimas `cubetas` de la resolución, de la más antigua a la actual (None si no hubo análisis)."""
+        duracion, cantidad = self.resoluciones[resolucion]
+        actual = int((time.time() if ahora is None else ahora) // duracion)
+        anillo = self._anillos[resolucion]
+        serie = []
+        for clave in range(actual - min(cubetas, cantidad) + 1, actual + 1):
+            cubeta = anillo[clave % cantidad]
+            serie.append((clave * duracion, cubeta if cubeta is not None and cubeta.clave == clave else None))
+        return serie
+    
+    def resumen(self, segundos: float, resolucion: Optional[str] = None,
+                ahora: Optional[float] = None, max_puntos: int = MAX_PUNTOS_TENDENCIA) -> Dict[str, any]:
+        """
+        Totales de los últimos `segundos` y su serie temporal.
+        
+        Args:
+            segundos: Amplitud de la ventana hacia atrás desde ahora
+            resolucion: "minuto", "hora" o "dia"; por defecto la más fina que
+                la cubre con como mucho `max_puntos` cubetas
+            ahora: Instante de referencia (timestamp), por defecto el actual
+            max_puntos: Puntos de la serie como máximo; si la ventana tiene más
+                cubetas, cada punto suma varias consecutivas
+            
+        Returns:
+            Diccionario con total, distribución, confianza promedio y serie
+        """
+        resolucion = resolucion or self.resolucion_para(segundos, max_puntos) or self.resolucion_para(segundos) or max(
+            self.resoluciones, key=lambda nombre: self.resoluciones[nombre][0] * self.resoluciones[nombre][1]
+        )
+        duracion, _ = self.resoluciones[resolucion]
+        cubetas = self.serie(resolucion, max(1, math.ceil(segundos / duracion)), ahora)
+        por_punto = math.ceil(len(cubetas) / max(1, max_puntos))
+        distribucion = Counter()
+        suma_confianza = 0.0
+        puntos = []
+        for desde in range(0, len(cubetas), por_punto):
+            grupo = [cubeta for _, cubeta in cubetas[desde:desde + por_punto] if cubeta is not None]
+            distribucion_punto = Counter()
+            confianza_punto = 0.0
+            for cubeta in grupo:
+                distribucion_punto.update(cubeta.distribucion)
+                confianza_punto += cubeta.suma_confianza
+            total = sum(distribucion_punto.values())
+            distribucion.update(distribucion_punto)
+            suma_confianza += confianza_punto
+            puntos.append({
+                "inicio": datetime.fromtimestamp(cubetas[desde][0]).isoformat(timespec="minutes"),
+                "total": total,
+                "distribucion": {s: distribucion_punto[s] for s in SENTIMIENTOS if distribucion_punto[s]},
+                "confianza_promedio": confianza_punto / total if total else 0.0,
+            })
+        total = sum(distribucion.values())
+        return {
+            "resolucion": resolucion,
+            "minutos_por_punto": duracion * por_punto // 60,
+            "total_analisis": total,
+            "distribucion_sentimientos": {s: distribucion[s] for s in SENTIMIENTOS if distribucion[s]},
+            "confianza_promedio": suma_confianza / total if total else 0.0,
+            "serie": puntos,
+        }
+
+# -------------------------
+# Historial por Sesión
+# -------------------------
+
+MAX_SESIONES_HISTORIAL = int(os.getenv("SENTIMIENTO_MAX_SESIONES", "1000"))  # sesiones en memoria
+# Agregado de todas las sesiones para palabras frecuentes y tendencias; "0" lo desactiva
+AGREGADO_GLOBAL = os.getenv("SENTIMIENTO_AGREGADO_GLOBAL", "1") != "0"
+SESION_LOCAL = "local"  # llamadas directas, fuera de una sesión de ADK
+
+class HistorialesSesion:
+    """
+    Un HistorialAnalisis por sesión de ADK, para que cada usuario vea y
+    limpie solo sus análisis.
+    
+    El registro solo se bloquea para buscar o crear la sesión, y el buffer
+    y los contadores de cada sesión tienen su propio lock. Lo que comparten
+    todas las sesiones es la cola del almacén SQLite (agregar solo encola la
+    fila; escribe un hilo de fondo) y, si está activo, el agregado global de
+    registrar_analisis. Al pasar de `maximo` se descarta de memoria la sesión
+    usada hace más tiempo (lo guardado en SQLite se conserva).
+    
+    La base de `ruta_almacen` se abre con la primera sesión, no al importar
+    el módulo.
+    """
+    
+    def __init__(self, maximo: int = MAX_SESIONES_HISTORIAL, capacidad: int = CAPACIDAD_HISTORIAL,
+                 ruta_almacen: Optional[str] = None):
+        self.maximo = maximo
+        self.capacidad = capacidad
+        self.ruta_almacen = ruta_almacen
+        self.almacen: Optional[AlmacenHistorial] = None
+        self._almacen_abierto = False
+        self._sesiones: "OrderedDict[str, HistorialAnalisis]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._sesiones)
+    
+    def obtener(self, sesion: str) -> HistorialAnalisis:
+        """Historial de la sesión, creándolo si no existe."""
+        with self._lock:
+            historial = self._sesiones.get(sesion)
+            if historial is None:
+                if not self._almacen_abierto:
+                    self.almacen = _abrir_almacen(self.ruta_almacen)
+                    self._almacen_abierto = True
+                historial = self._sesiones[sesion] = HistorialAnalisis(
+                    self.capacidad, self.almacen, sesion=sesion, agregados=False
+                )
+                if len(self._sesiones) > self.maximo:
+                    self._sesiones.popitem(last=False)
+            else:
+                self._sesiones.move_to_end(sesion)
+            return historial
+
+def sesion_de(tool_context: Optional[ToolContext]) -> str:
+    """Id de la sesión de ADK que llama a la herramienta (SESION_LOCAL fuera de ADK)."""
+    if tool_context is None:
+        return SESION_LOCAL
+    sesion = getattr(tool_context, "session", None)
+    if sesion is None:
+        sesion = getattr(getattr(tool_context, "_invocation_context", None), "session", None)
+    return sesion.id if sesion is not None else SESION_LOCAL
+
+def registrar_analisis(resultado: AnalisisResultado, tool_context: Optional[ToolContext] = None,
+                       sesion: Optional[str] = None):
+    """
+    Guarda un análisis en el historial de su sesión (`sesion` o la de
+    tool_context) y en el agregado global.
+    
+    El agregado global (palabras frecuentes y tendencias) tiene un único
+    lock para todas las sesiones; con SENTIMIENTO_AGREGADO_GLOBAL=0 no se
+    mantiene y cada análisis solo toca los locks de su sesión y de la cola
+    de SQLite (SENTIMIENTO_HISTORIAL_DB="" quita también esta).
+    """
+    historiales.obtener(sesion or sesion_de(tool_context)).agregar(resultado)
+    if historial_global is not None:
+        historial_global.agregar(resultado)
+
 # -------------------------
 # Estado Global
 # -------------------------
 
-historial = HistorialAnalisis()
+historiales = HistorialesSesion(ruta_almacen=RUTA_HISTORIAL_DB)
+historial_global = HistorialAnalisis(agregados=True) if AGREGADO_GLOBAL else None
 
 # -------------------------
 # Funciones Auxiliares
@@ -225,16 +932,1206 @@ def determinar_sentimiento_y_confianza(puntuacion: float, total_palabras: int) -
     
     return sentimiento, confianza
 
+# -------------------------
+# Motor de Puntuación
+# -------------------------
+
+# Palabras (secuencias \w, como limpiar_texto() + split()) y signos que cierran una cláusula
+PATRON_TOKEN = re.compile(r"\w+|[.;:!?]")
+FIN_DE_CLAUSULA = frozenset(".;:!?")
+
+# En los lotes los textos se unen con este separador y se tokenizan de una vez
+SEPARADOR_LOTE = "\x00"
+PATRON_TOKEN_LOTE = re.compile(r"\w+|[.;:!?\x00]")
+
+# Un modificador afecta a las palabras con polaridad de las siguientes N posiciones
+VENTANA_MODIFICADORES = 3
+
+@dataclass(frozen=True)
+class EntradaLexico:
+    """Papel de una palabra o frase en el léxico compilado."""
+    indice: int  # posición en el léxico compilado y en sus tablas vectoriales
+    polaridad: float  # +1.0 positiva, -1.0 negativa, 0.0 sin polaridad
+    categoria: Optional[str]  # "positivas", "negativas", "neutrales" o None
+    modificador: Optional[float]  # factor de MODIFICADORES, si lo es
+    clave: Optional[str]  # "+palabra"/"-palabra" para palabras_clave
+    emocion: Optional[str] = None  # clave de EMOCIONES, si la expresa
+
+@dataclass
+class PuntuacionTexto:
+    """Resultado de una pasada del motor sobre un texto."""
+    puntuacion: float  # con modificadores aplicados, sin normalizar
+    palabras_clave: List[str]
+    estadisticas: Dict[str, int]
+    emociones: Dict[str, int] = field(default_factory=dict)  # emoción -> apariciones
+
+CATEGORIAS = ("positivas", "negativas", "neutrales")
+
+def normalizar_frase(frase: str) -> str:
+    """Palabras de la frase en minúsculas separadas por un espacio, como se buscan en el léxico."""
+    return " ".join(PATRON_TOKEN.findall(frase.lower()))
+
+def crear_entrada(frase: str, categoria: Optional[str], modificador: Optional[float] = None,
+                  emocion: Optional[str] = None, indice: int = 0) -> EntradaLexico:
+    """
+    Crea la entrada de léxico de una palabra o frase.
+    
+    Las palabras sueltas de dos letras ("no", "ni") no tienen polaridad propia,
+    igual que en obtener_palabras(), aunque conservan su papel de modificador.
+    """
+    if " " not in frase and len(frase) <= 2:
+        categoria = None
+    if categoria == "positivas":
+        polaridad, clave = 1.0, f"+{frase}"
+    elif categoria == "negativas":
+        polaridad, clave = -1.0, f"-{frase}"
+    else:
+        polaridad, clave = 0.0, None
+    return EntradaLexico(indice, polaridad, categoria, modificador, clave, emocion)
+
+def compilar_lexico() -> Dict[str, EntradaLexico]:
+    """
+    Fusiona los diccionarios de palabras y modificadores en una sola tabla.
+    
+    Returns:
+        Diccionario palabra o frase -> EntradaLexico, con la misma precedencia que
+        calcular_puntuacion_base (positiva, luego negativa, luego neutral). Las
+        palabras de EMOCIONES llevan además su emoción, así que emociones y
+        sentimiento salen de la misma búsqueda.
+    """
+    emocion_de = {}
+    for emocion, palabras in EMOCIONES.items():
+        for palabra in palabras:
+            emocion_de.setdefault(palabra, emocion)
+    
+    lexico = {}
+    for palabra in sorted(PALABRAS_POSITIVAS | PALABRAS_NEGATIVAS | PALABRAS_NEUTRALES
+                          | MODIFICADORES.keys() | emocion_de.keys()):
+        if palabra in PALABRAS_POSITIVAS:
+            categoria = "positivas"
+        elif palabra in PALABRAS_NEGATIVAS:
+            categoria = "negativas"
+        elif palabra in PALABRAS_NEUTRALES:
+            categoria = "neutrales"
+        else:
+            categoria = None
+        lexico[palabra] = crear_entrada(
+            palabra, categoria, MODIFICADORES.get(palabra), emocion_de.get(palabra), len(lexico)
+        )
+    return lexico
+
+# -------------------------
+# Léxico Compilado
+# -------------------------
+
+# Léxico compilado con compilar_lexico.py; si el archivo no existe se usan los
+# diccionarios de este módulo. Se recarga solo cuando el archivo cambia.
+RUTA_LEXICO = os.getenv(
+    "SENTIMIENTO_LEXICO",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexico_sentimientos.bin"),
+)
+INTERVALO_RECARGA_LEXICO = 1.0  # segundos entre comprobaciones del archivo
+LIMITE_MEMO_LEXICO = 200000  # búsquedas recordadas por léxico
+
+LEXICO_MAGIC = b"LEXSEN01"
+# magic, entradas, off_registros, off_polaridad, off_modificador, off_frases, off_nombres, largo_nombres, versión
+LEXICO_CABECERA = struct.Struct("<8sIIIIIII16s")
+# offset y largo de la frase, categoría y emoción (-1 = ninguna)
+LEXICO_REGISTRO = struct.Struct("<IHbb")
+
+def serializar_lexico(lexico: Dict[str, EntradaLexico]) -> bytes:
+    """
+    Empaqueta un léxico en el formato binario que lee LexicoCompilado.
+    
+    Las frases se ordenan por sus bytes UTF-8 para buscarlas por bisección;
+    polaridades y modificadores van en columnas float64 alineadas que NumPy
+    usa sin copiar. La versión es una huella del contenido.
+    
+    Args:
+        lexico: Diccionario frase -> EntradaLexico (los índices se reasignan)
+        
+    Returns:
+        Contenido del archivo
+    """
+    normalizado = {normalizar_frase(frase).encode("utf-8"): entrada for frase, entrada in lexico.items()}
+    claves = sorted(normalizado)
+    emociones = sorted({e.emocion for e in normalizado.values() if e.emocion})
+    
+    registros = bytearray()
+    frases = bytearray()
+    for clave in claves:
+        entrada = normalizado[clave]
+        registros += LEXICO_REGISTRO.pack(
+            len(frases), len(clave),
+            CATEGORIAS.index(entrada.categoria) if entrada.categoria else -1,
+            emociones.index(entrada.emocion) if entrada.emocion else -1,
+        )
+        frases += clave
+    n = len(claves)
+    polaridad = struct.pack(f"<{n}d", *(normalizado[c].polaridad for c in claves))
+    modificador = struct.pack(f"<{n}d", *(
+        normalizado[c].modificador if normalizado[c].modificador is not None else math.nan for c in claves
+    ))
+    nombres = json.dumps({
+        "emociones": emociones,
+        "frases": [i for i, clave in enumerate(claves) if b" " in clave],
+    }).encode("utf-8")
+    
+    off_registros = LEXICO_CABECERA.size + (-LEXICO_CABECERA.size) % 8
+    off_polaridad = off_registros + len(registros)
+    off_modificador = off_polaridad + len(polaridad)
+    off_frases = off_modificador + len(modificador)
+    off_nombres = off_frases + len(frases)
+    cuerpo = b"".join((registros, polaridad, modificador, bytes(frases), nombres))
+    version = hashlib.blake2b(cuerpo, digest_size=8).hexdigest().encode("ascii")
+    cabecera = LEXICO_CABECERA.pack(
+        LEXICO_MAGIC, n, off_registros, off_polaridad, off_modificador, off_frases, off_nombres, len(nombres), version
+    )
+    return cabecera + bytes(off_registros - len(cabecera)) + cuerpo
+
+class LexicoCompilado:
+    """
+    Léxico de solo lectura sobre el formato de serializar_lexico, normalmente
+    un archivo mapeado en memoria: abrirlo no construye ninguna estructura y
+    sus páginas se comparten entre procesos.
+    
+    Las búsquedas son por bisección sobre las frases ordenadas y se memorizan
+    (las palabras de un texto real se repiten mucho), y las entradas se crean
+    al primer uso.
+    """
+    
+    def __init__(self, datos, origen: str):
+        (magia, self.total, self._off_registros, self._off_polaridad, self._off_modificador,
+         self._off_frases, off_nombres, largo_nombres, version) = LEXICO_CABECERA.unpack_from(datos, 0)
+        if magia != LEXICO_MAGIC:
+            raise ValueError(f"{origen} no es un léxico compilado")
+        self._datos = datos
+        self.origen = origen
+        self.version = version.decode("ascii")
+        nombres = json.loads(bytes(datos[off_nombres:off_nombres + largo_nombres]))
+        self.emociones = nombres["emociones"]
+        self.frases = [(tuple(self._frase(i).decode("utf-8").split(" ")), i) for i in nombres["frases"]]
+        self.memo: Dict[str, Tuple[Optional[EntradaLexico], bool]] = {}
+        self._entradas: Dict[int, EntradaLexico] = {}
+        self._tablas = None
+    
+    @classmethod
+    def abrir(cls, ruta: str) -> "LexicoCompilado":
+        with open(ruta, "rb") as archivo:
+            datos = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(datos, ruta)
+    
+    def _frase(self, indice: int) -> bytes:
+        offset, largo, _, _ = LEXICO_REGISTRO.unpack_from(self._datos, self._off_registros + indice * LEXICO_REGISTRO.size)
+        inicio = self._off_frases + offset
+        return self._datos[inicio:inicio + largo]
+    
+    def _limite_inferior(self, clave: bytes) -> int:
+        bajo, alto = 0, self.total
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if self._frase(medio) < clave:
+                bajo = medio + 1
+            else:
+                alto = medio
+        return bajo
+    
+    def entrada(self, indice: int) -> EntradaLexico:
+        entrada = self._entradas.get(indice)
+        if entrada is None:
+            offset, largo, categoria, emocion = LEXICO_REGISTRO.unpack_from(
+                self._datos, self._off_registros + indice * LEXICO_REGISTRO.size
+            )
+            (modificador,) = struct.unpack_from("<d", self._datos, self._off_modificador + indice * 8)
+            entrada = crear_entrada(
+                self._frase(indice).decode("utf-8"),
+                CATEGORIAS[categoria] if categoria >= 0 else None,
+                None if math.isnan(modificador) else modificador,
+                self.emociones[emocion] if emocion >= 0 else None,
+                indice,
+            )
+            self._entradas[indice] = entrada
+        return entrada
+    
+    def buscar(self, frase: str) -> Tuple[Optional[EntradaLexico], bool]:
+        """
+        Busca una palabra o frase normalizada.
+        
+        Returns:
+            Tupla (entrada o None, si alguna frase del léxico continúa a esta)
+        """
+        resultado = self.memo.get(frase)
+        if resultado is not None:
+            return resultado
+        clave = frase.encode("utf-8")
+        indice = self._limite_inferior(clave)
+        entrada = self.entrada(indice) if indice < self.total and self._frase(indice) == clave else None
+        prefijo = clave + b" "
+        siguiente = self._limite_inferior(prefijo)
+        continua = siguiente < self.total and self._frase(siguiente).startswith(prefijo)
+        if len(self.memo) >= LIMITE_MEMO_LEXICO:
+            self.memo.clear()
+        resultado = self.memo[frase] = (entrada, continua)
+        return resultado
+    
+    def indice(self, frase: str) -> int:
+        entrada = self.buscar(frase)[0]
+        return -1 if entrada is None else entrada.indice
+    
+    def tablas(self) -> Dict[str, "np.ndarray"]:
+        """Columnas del léxico como arrays NumPy (vistas sobre el archivo, sin copia)."""
+        if self._tablas is None:
+            registros = np.frombuffer(
+                self._datos, dtype=np.dtype([("offset", "<u4"), ("largo", "<u2"), ("categoria", "i1"), ("emocion", "i1")]),
+                count=self.total, offset=self._off_registros,
+            )
+            modificador = np.frombuffer(self._datos, dtype="<f8", count=self.total, offset=self._off_modificador)
+            self._tablas = {
+                "polaridad": np.frombuffer(self._datos, dtype="<f8", count=self.total, offset=self._off_polaridad),
+                "categoria": registros["categoria"].astype(np.intp),
+                "modificador": modificador,
+                "es_modificador": ~np.isnan(modificador),
+            }
+        return self._tablas
+
+class FuenteLexico:
+    """
+    Léxico activo del agente: el archivo compilado si existe o, si no, los
+    diccionarios de este módulo.
+    
+    Como mucho una vez por INTERVALO_RECARGA_LEXICO comprueba si el archivo
+    cambió (inodo, tamaño, fecha) y, si es así, mapea el nuevo y lo publica
+    con una sola asignación; quien ya tenía el anterior termina con él.
+    """
+    
+    def __init__(self, ruta: Optional[str]):
+        self.ruta = ruta
+        self.recargas = 0
+        self._firma = None
+        self._proxima_comprobacion = 0.0
+        self._lock = threading.Lock()
+        self.lexico = LexicoCompilado(serializar_lexico(compilar_lexico()), "diccionarios del módulo")
+        self.actual()
+    
+    def actual(self) -> LexicoCompilado:
+        if time.monotonic() >= self._proxima_comprobacion:
+            with self._lock:
+                if time.monotonic() >= self._proxima_comprobacion:
+                    self._proxima_comprobacion = time.monotonic() + INTERVALO_RECARGA_LEXICO
+                    self._comprobar_archivo()
+        return self.lexico
+    
+    def _comprobar_archivo(self):
+        if not self.ruta:
+            return
+        try:
+            estado = os.stat(self.ruta)
+        except FileNotFoundError:
+            return
+        firma = (estado.st_ino, estado.st_size, estado.st_mtime_ns)
+        if firma == self._firma:
+            return
+        self._firma = firma
+        try:
+            nuevo = LexicoCompilado.abrir(self.ruta)
+        except (OSError, ValueError, struct.error) as error:
+            logger.warning(f"⚠️ No se pudo cargar el léxico {self.ruta}: {error}")
+            return
+        if nuevo.version != self.lexico.version:
+            self.recargas += 1
+        self.lexico = nuevo
+        logger.info(f"📚 Léxico {nuevo.version} cargado desde {self.ruta} ({nuevo.total} entradas)")
+
+fuente_lexico = FuenteLexico(RUTA_LEXICO)
+
+def emparejar_tokens(tokens: List[str], lexico: Optional[LexicoCompilado] = None
+                     ) -> Tuple[List[Tuple[int, int, Optional[EntradaLexico]]], int]:
+    """
+    Recorre los tokens una vez buscando palabras y frases del léxico.
+    
+    En cada posición se toma la coincidencia más larga (la frase "un poco"
+    gana a "un"): una frase solo se extiende mientras el léxico tenga otra
+    más larga que la continúe, así que el coste es lineal en el texto.
+    
+    Args:
+        tokens: Salida de PATRON_TOKEN.findall() sobre el texto en minúsculas
+        lexico: Léxico a usar; por defecto el activo
+        
+    Returns:
+        Tupla (coincidencias, total_palabras): cada coincidencia es
+        (inicio, fin, entrada), con entrada None para un fin de cláusula;
+        total_palabras cuenta las palabras de más de dos letras
+    """
+    lexico = lexico or fuente_lexico.actual()
+    memo = lexico.memo
+    buscar = lexico.buscar
+    coincidencias = []
+    total = 0
+    i = 0
+    n = len(tokens)
+    
+    while i < n:
+        token = tokens[i]
+        if token in FIN_DE_CLAUSULA:
+            coincidencias.append((i, i, None))
+            i += 1
+            continue
+        entrada, continua = memo.get(token) or buscar(token)
+        fin = i
+        j = i
+        frase = token
+        while continua and j + 1 < n:
+            j += 1
+            frase = f"{frase} {tokens[j]}"
+            candidata, continua = buscar(frase)
+            if candidata is not None:
+                entrada, fin = candidata, j
+        if fin == i:
+            total += len(token) > 2
+        else:
+            total += sum(len(palabra) > 2 for palabra in tokens[i:fin + 1])
+        if entrada is not None:
+            coincidencias.append((i, fin, entrada))
+        i = fin + 1
+    
+    return coincidencias, total
+
+def puntuar_texto(texto: str) -> PuntuacionTexto:
+    """
+    Tokeniza el texto una sola vez y calcula puntuación, palabras clave y
+    estadísticas en la misma pasada sobre las coincidencias del léxico.
+    
+    Cada modificador multiplica solo las palabras con polaridad que aparecen
+    en las VENTANA_MODIFICADORES posiciones siguientes dentro de la misma
+    cláusula ("no es bueno, es excelente" invierte "bueno" pero no "excelente"
+    si quedan fuera de la ventana).
+    
+    Args:
+        texto: Texto a puntuar
+        
+    Returns:
+        PuntuacionTexto con la puntuación sin normalizar
+    """
+    return puntuar_tokens(PATRON_TOKEN.findall(texto.lower()))
+
+def puntuar_tokens(tokens: List[str], lexico: Optional[LexicoCompilado] = None) -> PuntuacionTexto:
+    """Cuerpo de puntuar_texto sobre tokens ya extraídos (PATRON_TOKEN en minúsculas)."""
+    coincidencias, total = emparejar_tokens(tokens, lexico or fuente_lexico.actual())
+    ventana = VENTANA_MODIFICADORES
+    puntuacion = 0.0
+    palabras_clave = []
+    conteos = {"positivas": 0, "negativas": 0, "neutrales": 0}
+    emociones = {}
+    activos = []  # (posición final, factor) de los modificadores en alcance
+    
+    for inicio, fin, entrada in coincidencias:
+        if entrada is None:
+            activos.clear()
+            continue
+        if entrada.categoria is not None:
+            conteos[entrada.categoria] += 1
+        if entrada.emocion is not None:
+            emociones[entrada.emocion] = emociones.get(entrada.emocion, 0) + 1
+        if entrada.clave is not None:
+            factor = 1.0
+            for posicion, modificador in activos:
+                if posicion >= inicio - ventana:
+                    factor *= modificador
+            puntuacion += entrada.polaridad * factor
+            palabras_clave.append(entrada.clave)
+        if entrada.modificador is not None:
+            if activos and activos[0][0] < fin - ventana:
+                activos = [activo for activo in activos if activo[0] >= fin - ventana]
+            activos.append((fin, entrada.modificador))
+    
+    conteos["total"] = total
+    return PuntuacionTexto(puntuacion, palabras_clave, conteos, emociones)
+
+# -------------------------
+# Caché de Resultados
+# -------------------------
+
+CAPACIDAD_CACHE = 4096  # textos distintos recordados
+
+class CachePuntuaciones:
+    """
+    Caché LRU de PuntuacionTexto direccionada por contenido.
+    
+    La clave es un blake2b del texto normalizado (minúsculas y espacios
+    colapsados, que no cambian la puntuación); cuando cambia la versión del
+    léxico activo se descartan todas las entradas.
+    """
+    
+    def __init__(self, capacidad: int = CAPACIDAD_CACHE):
+        self.capacidad = capacidad
+        self._entradas: "OrderedDict[bytes, PuntuacionTexto]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = fuente_lexico.actual().version
+        self.aciertos = 0
+        self.fallos = 0
+    
+    @staticmethod
+    def clave(texto: str) -> bytes:
+        normalizado = " ".join(texto.lower().split())
+        return hashlib.blake2b(normalizado.encode("utf-8"), digest_size=16).digest()
+    
+    def puntuar(self, texto: str) -> PuntuacionTexto:
+        """Devuelve la puntuación guardada o la calcula con puntuar_texto y la guarda."""
+        clave = self.clave(texto)
+        version = fuente_lexico.actual().version
+        with self._lock:
+            if self._version != version:
+                self._entradas.clear()
+                self._version = version
+            resultado = self._entradas.get(clave)
+            if resultado is not None:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return resultado
+            self.fallos += 1
+        
+        resultado = puntuar_texto(texto)
+        with self._lock:
+            self._entradas[clave] = resultado
+            if len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+        return resultado
+    
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.aciertos = self.fallos = 0
+    
+    def estadisticas(self) -> Dict[str, any]:
+        consultas = self.aciertos + self.fallos
+        return {
+            "entradas": len(self._entradas),
+            "capacidad": self.capacidad,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": round(self.aciertos / consultas, 3) if consultas else 0.0,
+            "version_lexico": self._version,
+        }
+
+cache_puntuaciones = CachePuntuaciones()
+
+def obtener_estadisticas_cache() -> Dict[str, any]:
+    """Métricas de la caché de puntuaciones (aciertos, fallos, tasa de aciertos)."""
+    return cache_puntuaciones.estadisticas()
+
+# -------------------------
+# Puntuación por Lotes
+# -------------------------
+
+EMOJI_SENTIMIENTO = {"positivo": "😊", "negativo": "😞", "neutral": "😐"}
+SENTIMIENTOS = ("positivo", "negativo", "neutral")
+
+@dataclass
+class ResultadoLote:
+    """Puntuación de un lote de textos, alineada con el orden de entrada."""
+    sentimientos: List[Optional[str]]  # None para textos sin palabras válidas
+    confianzas: List[float]
+    puntuaciones: List[float]  # normalizadas por número de palabras
+    estadisticas: List[Dict[str, int]]
+    palabras_clave: Optional[List[List[str]]]  # solo con con_detalle=True
+    distribucion: Dict[str, int]
+    confianza_promedio: float  # sobre los textos analizados
+    
+    @property
+    def analizados(self) -> int:
+        return sum(self.distribucion.values())
+
+def _resumir_lote(sentimientos, confianzas, puntuaciones, estadisticas, palabras_clave) -> ResultadoLote:
+    validas = [c for s, c in zip(sentimientos, confianzas) if s is not None]
+    distribucion = Counter(s for s in sentimientos if s is not None)
+    return ResultadoLote(
+        sentimientos=sentimientos,
+        confianzas=confianzas,
+        puntuaciones=puntuaciones,
+        estadisticas=estadisticas,
+        palabras_clave=palabras_clave,
+        distribucion={s: distribucion[s] for s in SENTIMIENTOS if distribucion[s]},
+        confianza_promedio=sum(validas) / len(validas) if validas else 0.0,
+    )
+
+def _puntuar_lote_python(textos: List[str], con_detalle: bool) -> ResultadoLote:
+    sentimientos, confianzas, puntuaciones, estadisticas = [], [], [], []
+    palabras_clave = [] if con_detalle else None
+    for texto in textos:
+        puntuado = puntuar_texto(texto)
+        total = puntuado.estadisticas["total"]
+        if total:
+            sentimiento, confianza = determinar_sentimiento_y_confianza(puntuado.puntuacion, total)
+            puntuacion = puntuado.puntuacion / total
+        else:
+            sentimiento, confianza, puntuacion = None, 0.0, 0.0
+        sentimientos.append(sentimiento)
+        confianzas.append(confianza)
+        puntuaciones.append(puntuacion)
+        estadisticas.append(puntuado.estadisticas)
+        if con_detalle:
+            palabras_clave.append(puntuado.palabras_clave)
+    return _resumir_lote(sentimientos, confianzas, puntuaciones, estadisticas, palabras_clave)
+
+def _emparejar_frases(codigos: "np.ndarray", entradas: "np.ndarray", finales: "np.ndarray", frases: list) -> None:
+    """Marca las frases del léxico sobre el array de códigos, con el mismo criterio que emparejar_tokens."""
+    candidatas = []
+    for patron, indice in frases:
+        largo = len(patron)
+        if len(codigos) < largo:
+            continue
+        coincide = codigos[:len(codigos) - largo + 1] == patron[0]
+        for desplazamiento in range(1, largo):
+            coincide &= codigos[desplazamiento:len(codigos) - largo + 1 + desplazamiento] == patron[desplazamiento]
+        candidatas.extend((int(inicio), -largo, indice) for inicio in np.flatnonzero(coincide))
+    # Las frases son pocas: se resuelven solapes de izquierda a derecha, la más larga primero
+    ultimo_fin = -1
+    for inicio, menos_largo, indice in sorted(candidatas):
+        if inicio <= ultimo_fin:
+            continue
+        ultimo_fin = inicio - menos_largo - 1
+        entradas[inicio + 1:ultimo_fin + 1] = -1
+        entradas[inicio] = indice
+        finales[inicio] = ultimo_fin
+
+def _puntuar_lote_numpy(textos: List[str], con_detalle: bool) -> ResultadoLote:
+    lexico = fuente_lexico.actual()
+    tablas = lexico.tablas()
+    ventana = VENTANA_MODIFICADORES
+    n = len(textos)
+    
+    # Todo el lote se tokeniza con una sola llamada; el separador corta
+    # cláusulas, así que ni frases ni modificadores cruzan de un texto a otro
+    unido = SEPARADOR_LOTE.join(textos)
+    if unido.count(SEPARADOR_LOTE) != n - 1:
+        unido = SEPARADOR_LOTE.join(texto.replace(SEPARADOR_LOTE, " ") for texto in textos)
+    tokens = PATRON_TOKEN_LOTE.findall(unido.lower())
+    cantidad = len(tokens)
+    
+    # Texto -> array de códigos y de entradas del léxico (matriz dispersa
+    # documento x entrada en formato plano). Cada palabra distinta del lote
+    # se busca una vez en el léxico; el resto son operaciones sobre arrays
+    vocabulario = {token: codigo for codigo, token in enumerate(dict.fromkeys(tokens))}
+    unicos = list(vocabulario)
+    codigos = np.fromiter(map(vocabulario.__getitem__, tokens), dtype=np.intp, count=cantidad)
+    entrada_de_codigo = np.fromiter(map(lexico.indice, unicos), dtype=np.intp, count=len(unicos))
+    largo_de_codigo = np.fromiter(map(len, unicos), dtype=np.intp, count=len(unicos))
+    es_corte = np.array([token in FIN_DE_CLAUSULA or token == SEPARADOR_LOTE for token in unicos], dtype=bool)
+    documento_de_token = np.cumsum(codigos == vocabulario.get(SEPARADOR_LOTE, -1))
+    entradas = entrada_de_codigo[codigos]
+    finales = np.arange(cantidad)
+    frases = [
+        (tuple(vocabulario[palabra] for palabra in palabras), indice)
+        for palabras, indice in lexico.frases
+        if all(palabra in vocabulario for palabra in palabras)
+    ]
+    if frases:
+        _emparejar_frases(codigos, entradas, finales, frases)
+    totales = np.bincount(documento_de_token, weights=largo_de_codigo[codigos] > 2, minlength=n)
+    cortes = np.concatenate(([-1], np.flatnonzero(es_corte[codigos])))  # -1: inicio del lote
+    
+    inicios = np.flatnonzero(entradas >= 0)
+    ids = entradas[inicios]
+    fines = finales[inicios]
+    documentos = documento_de_token[inicios]
+    
+    es_modificador = tablas["es_modificador"][ids]
+    posiciones_mod = fines[es_modificador]
+    valores_mod = tablas["modificador"][ids][es_modificador]
+    
+    polaridad = tablas["polaridad"][ids]
+    polar = polaridad != 0.0
+    inicio_polar = inicios[polar]
+    ultimo_corte = cortes[np.searchsorted(cortes, inicio_polar) - 1]
+    desde = np.maximum(inicio_polar - ventana, ultimo_corte + 1)
+    a = np.searchsorted(posiciones_mod, desde)
+    b = np.searchsorted(posiciones_mod, inicio_polar)
+    # Los modificadores de la ventana (a lo sumo VENTANA_MODIFICADORES) se
+    # multiplican en orden de aparición, como en puntuar_tokens, y bincount
+    # suma en el orden del texto: las puntuaciones coinciden bit a bit
+    factor = np.ones(len(inicio_polar))
+    for paso in range(int((b - a).max(initial=0))):
+        en_ventana = a + paso < b
+        factor[en_ventana] *= valores_mod[a[en_ventana] + paso]
+    brutas = np.bincount(documentos[polar], weights=polaridad[polar] * factor, minlength=n)
+    
+    # Misma regla que determinar_sentimiento_y_confianza, para todo el lote
+    validos = totales > 0
+    normalizadas = np.divide(brutas, totales, out=np.zeros(n), where=validos)
+    codigos_sentimiento = np.where(normalizadas > 0.1, 0, np.where(normalizadas < -0.1, 1, 2))
+    confianzas = np.minimum(np.abs(normalizadas) * 2, 1.0)
+    confianzas = np.where(totales < 5, confianzas * 0.7,
+                          np.where(totales > 20, np.minimum(confianzas * 1.2, 1.0), confianzas))
+    confianzas[~validos] = 0.0
+    
+    categorias = tablas["categoria"][ids]
+    con_categoria = categorias >= 0
+    conteos = np.bincount(documentos[con_categoria] * 3 + categorias[con_categoria], minlength=3 * n).reshape(n, 3)
+    
+    palabras_clave = None
+    if con_detalle:
+        palabras_clave = [[] for _ in range(n)]
+        for documento, indice in zip(documentos.tolist(), ids.tolist()):
+            clave = lexico.entrada(indice).clave
+            if clave is not None:
+                palabras_clave[documento].append(clave)
+    
+    sentimientos = [SENTIMIENTOS[c] if v else None for c, v in zip(codigos_sentimiento.tolist(), validos.tolist())]
+    estadisticas = [
+        {"positivas": p, "negativas": ng, "neutrales": ne, "total": t}
+        for (p, ng, ne), t in zip(conteos.tolist(), totales.astype(np.int64).tolist())
+    ]
+    return _resumir_lote(sentimientos, confianzas.tolist(), normalizadas.tolist(), estadisticas, palabras_clave)
+
+def puntuar_lote(textos: List[str], con_detalle: bool = False) -> ResultadoLote:
+    """
+    Puntúa muchos textos a la vez sin crear un AnalisisResultado por texto.
+    
+    Cada texto se tokeniza y se empareja con el léxico una vez; la aplicación
+    de modificadores, la normalización, el sentimiento, la confianza y las
+    estadísticas agregadas se calculan vectorizados con NumPy sobre todo el
+    lote (o en Python puro si NumPy no está instalado).
+    
+    Args:
+        textos: Textos a puntuar
+        con_detalle: Si True, incluye las palabras clave de cada texto
+        
+    Returns:
+        ResultadoLote con los mismos valores que analizar_sentimiento por texto
+    """
+    if np is None:
+        return _puntuar_lote_python(textos, con_detalle)
+    return _puntuar_lote_numpy(textos, con_detalle)
+
+# -------------------------
+# Procesamiento de Corpus
+# -------------------------
+
+TAMANO_BLOQUE_CORPUS = 5000  # textos por tarea enviada a un proceso
+
+@dataclass
+class AgregadoSentimiento:
+    """Totales de un corpus o de un bloque; se combinan sumando."""
+    total_textos: int = 0
+    distribucion: Counter = field(default_factory=Counter)
+    suma_confianza: float = 0.0
+    suma_puntuacion: float = 0.0
+    
+    @property
+    def analizados(self) -> int:
+        return sum(self.distribucion.values())
+    
+    @property
+    def confianza_promedio(self) -> float:
+        return self.suma_confianza / self.analizados if self.analizados else 0.0
+    
+    @property
+    def puntuacion_promedio(self) -> float:
+        return self.suma_puntuacion / self.analizados if self.analizados else 0.0
+    
+    def agregar_lote(self, lote: ResultadoLote):
+        """Suma los textos de un ResultadoLote."""
+        self.total_textos += len(lote.sentimientos)
+        for sentimiento, confianza, puntuacion in zip(lote.sentimientos, lote.confianzas, lote.puntuaciones):
+            if sentimiento is not None:
+                self.distribucion[sentimiento] += 1
+                self.suma_confianza += confianza
+                self.suma_puntuacion += puntuacion
+    
+    def combinar(self, otro: "AgregadoSentimiento"):
+        """Incorpora los totales de otro agregado (por ejemplo, de otro proceso)."""
+        self.total_textos += otro.total_textos
+        self.distribucion.update(otro.distribucion)
+        self.suma_confianza += otro.suma_confianza
+        self.suma_puntuacion += otro.suma_puntuacion
+
+def _agregar_bloque(textos: List[str]) -> AgregadoSentimiento:
+    """Tarea de un proceso trabajador: puntúa un bloque y devuelve solo sus totales."""
+    agregado = AgregadoSentimiento()
+    agregado.agregar_lote(puntuar_lote(textos))
+    return agregado
+
+def _contexto_procesos():
+    # fork no es seguro desde un proceso con hilos (adk web, el servidor
+    # HTTP). forkserver crea los trabajadores desde un proceso de un solo
+    # hilo que ya importó este módulo, así que no reimportan ADK cada uno;
+    # donde no existe (Windows) se usa el método por defecto
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        contexto = multiprocessing.get_context("forkserver")
+        contexto.set_forkserver_preload([__name__])
+        return contexto
+    return multiprocessing.get_context()
+
+def _por_bloques(elementos: Iterable, tamano: int) -> Iterator[list]:
+    iterador = iter(elementos)
+    return iter(lambda: list(islice(iterador, tamano)), [])
+
+def _mapear_bloques(funcion: Callable, bloques: Iterable[list], procesos: int) -> Iterator[tuple]:
+    """
+    Aplica `funcion` a cada bloque y entrega (bloque, resultado) en orden.
+    
+    Con varios procesos mantiene como mucho 2 tareas en vuelo por proceso,
+    así que consume la entrada al ritmo al que se procesa.
+    """
+    if procesos == 1:
+        for bloque in bloques:
+            yield bloque, funcion(bloque)
+        return
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=_contexto_procesos()) as pool:
+        en_vuelo = deque()
+        for bloque in bloques:
+            en_vuelo.append((bloque, pool.submit(funcion, bloque)))
+            if len(en_vuelo) >= 2 * procesos:
+                pendiente, futuro = en_vuelo.popleft()
+                yield pendiente, futuro.result()
+        while en_vuelo:
+            pendiente, futuro = en_vuelo.popleft()
+            yield pendiente, futuro.result()
+
+def procesar_corpus(textos: Iterable[str], procesos: Optional[int] = None,
+                    tamano_bloque: int = TAMANO_BLOQUE_CORPUS) -> AgregadoSentimiento:
+    """
+    Analiza un corpus grande repartiendo bloques de textos entre procesos.
+    
+    El iterable se consume por bloques y solo hay unas pocas tareas en vuelo
+    por proceso, así que un generador de millones de textos no se carga
+    entero en memoria.
+    
+    Args:
+        textos: Textos a analizar (lista o cualquier iterable)
+        procesos: Número de procesos; None usa todos los núcleos, 1 evita el pool
+        tamano_bloque: Textos por tarea
+        
+    Returns:
+        AgregadoSentimiento con la distribución y los promedios del corpus
+    """
+    procesos = procesos or os.cpu_count() or 1
+    agregado = AgregadoSentimiento()
+    for _, parcial in _mapear_bloques(_agregar_bloque, _por_bloques(textos, tamano_bloque), procesos):
+        agregado.combinar(parcial)
+    return agregado
+
+# -------------------------
+# Archivos JSONL/CSV
+# -------------------------
+
+PROGRESO_CADA = 100000  # registros entre mensajes de progreso
+
+def _abrir_texto(ruta: str, modo: str):
+    if ruta.endswith(".gz"):
+        return gzip.open(ruta, modo + "t", encoding="utf-8", newline="")
+    return open(ruta, modo, encoding="utf-8", newline="")
+
+def _formato_de(ruta: str) -> str:
+    return "csv" if ruta.removesuffix(".gz").endswith(".csv") else "jsonl"
+
+def leer_registros(ruta: str, campo: str = "texto", campo_id: Optional[str] = None,
+                   formato: Optional[str] = None) -> Iterator[Tuple[object, str]]:
+    """
+    Lee un archivo JSONL o CSV (opcionalmente .gz) registro a registro.
+    
+    Args:
+        ruta: Archivo de entrada
+        campo: Columna o clave con el texto
+        campo_id: Columna o clave con el identificador; si no, el número de registro
+        formato: "jsonl" o "csv"; por defecto se deduce de la extensión
+        
+    Returns:
+        Generador de (identificador, texto). Las líneas JSON inválidas o sin
+        el campo producen un texto vacío, que cuenta como no analizado.
+    """
+    formato = formato or _formato_de(ruta)
+    with _abrir_texto(ruta, "r") as archivo:
+        if formato == "csv":
+            filas = csv.DictReader(archivo)
+        else:
+            filas = (_decodificar_linea(linea) for linea in archivo if linea.strip())
+        for numero, fila in enumerate(filas, 1):
+            texto = fila.get(campo) if isinstance(fila, dict) else None
+            identificador = fila.get(campo_id, numero) if campo_id and isinstance(fila, dict) else numero
+            yield identificador, texto if isinstance(texto, str) else ""
+
+def _decodificar_linea(linea: str):
+    try:
+        return json.loads(linea)
+    except json.JSONDecodeError:
+        return None
+
+def _puntuar_registros(bloque: List[Tuple[object, str]]) -> ResultadoLote:
+    return puntuar_lote([texto for _, texto in bloque])
+
+def analizar_archivo(entrada: str, salida: Optional[str] = None, campo: str = "texto",
+                     campo_id: Optional[str] = None, procesos: int = 1,
+                     tamano_bloque: int = TAMANO_BLOQUE_CORPUS,
+                     progreso: Optional[Callable[[int, AgregadoSentimiento], None]] = None,
+                     progreso_cada: int = PROGRESO_CADA) -> AgregadoSentimiento:
+    """
+    Analiza un archivo JSONL/CSV en streaming con memoria constante.
+    
+    Lee, puntúa y escribe por bloques: en memoria solo hay los bloques en
+    vuelo, tenga el archivo mil o diez millones de filas. Los agregados se
+    actualizan a medida que avanza.
+    
+    Args:
+        entrada: Archivo JSONL o CSV (opcionalmente .gz)
+        salida: Archivo de resultados (JSONL o CSV según la extensión); None para solo agregar
+        campo: Columna o clave con el texto
+        campo_id: Columna o clave con el identificador de cada registro
+        procesos: Procesos para puntuar (ver procesar_corpus)
+        tamano_bloque: Registros por bloque
+        progreso: Función llamada con (registros, agregado) cada `progreso_cada`
+            registros; por defecto se registra en el log
+        progreso_cada: Registros entre llamadas de progreso
+        
+    Returns:
+        AgregadoSentimiento del archivo completo
+    """
+    logger.info(f"📄 Analizando archivo {entrada}")
+    agregado = AgregadoSentimiento()
+    inicio = time.perf_counter()
+    siguiente_aviso = progreso_cada
+    
+    def avisar(registros: int, agregado: AgregadoSentimiento):
+        velocidad = registros / max(time.perf_counter() - inicio, 1e-9)
+        logger.info(f"📄 {registros} registros analizados ({velocidad:.0f}/s)")
+    
+    progreso = progreso or avisar
+    with contextlib.ExitStack() as pila:
+        escribir = None
+        if salida:
+            archivo = pila.enter_context(_abrir_texto(salida, "w"))
+            if _formato_de(salida) == "csv":
+                escritor = csv.writer(archivo)
+                escritor.writerow(["id", "sentimiento", "confianza", "puntuacion"])
+                escribir = escritor.writerow
+            else:
+                escribir = lambda fila: archivo.write(json.dumps(
+                    dict(zip(("id", "sentimiento", "confianza", "puntuacion"), fila)), ensure_ascii=False) + "\n")
+        
+        bloques = _por_bloques(leer_registros(entrada, campo, campo_id), tamano_bloque)
+        for bloque, lote in _mapear_bloques(_puntuar_registros, bloques, procesos):
+            agregado.agregar_lote(lote)
+            if escribir:
+                for (identificador, _), sentimiento, confianza, puntuacion in zip(
+                        bloque, lote.sentimientos, lote.confianzas, lote.puntuaciones):
+                    escribir((identificador, sentimiento, round(confianza, 4), round(puntuacion, 4)))
+            if agregado.total_textos >= siguiente_aviso:
+                progreso(agregado.total_textos, agregado)
+                siguiente_aviso += progreso_cada
+    
+    return agregado
+
+# -------------------------
+# Documentos Largos
+# -------------------------
+
+SEGMENTO_PALABRAS = 200  # palabras a partir de las que un fin de oración cierra el segmento
+FIN_DE_ORACION = frozenset(".!?")
+TAMANO_PEDAZO_TEXTO = 65536  # caracteres que se tokenizan de una vez
+MIN_SEGMENTOS_SALIDA = 3  # segmentos mínimos antes de permitir la salida anticipada
+MAX_TRAMOS_LINEA_TEMPORAL = 20  # puntos de la línea temporal que se devuelven al modelo
+MAX_PALABRAS_CLAVE_DOCUMENTO = 10  # palabras clave de un documento que se devuelven y registran
+
+@dataclass
+class SegmentoSentimiento:
+    """Resultado de un segmento de un documento largo y del acumulado hasta él."""
+    indice: int
+    desde_palabra: int  # posición de su primera palabra en el documento
+    hasta_palabra: int  # posición siguiente a su última palabra
+    sentimiento: Optional[str]  # None si no tiene palabras válidas
+    confianza: float
+    puntuacion: float  # normalizada, solo del segmento
+    palabras_clave: List[str]
+    estadisticas: Dict[str, int]
+    sentimiento_acumulado: Optional[str]
+    confianza_acumulada: float
+    puntuacion_acumulada: float
+    salida_anticipada: bool = False  # el acumulado alcanzó el umbral y no se lee más
+
+def tokens_por_pedazos(fuente: Union[str, Iterable[str]]) -> Iterator[str]:
+    """
+    Tokens (PATRON_TOKEN, en minúsculas) de un texto o de sus pedazos,
+    por ejemplo las líneas de un archivo abierto.
+    
+    Un texto se recorre en pedazos de TAMANO_PEDAZO_TEXTO caracteres, así
+    que nunca se copia ni se tokeniza entero; una palabra que toca el final
+    de un pedazo se completa con el siguiente.
+    """
+    pedazos = fuente
+    if isinstance(fuente, str):
+        pedazos = (fuente[i:i + TAMANO_PEDAZO_TEXTO] for i in range(0, len(fuente), TAMANO_PEDAZO_TEXTO))
+    resto = ""
+    for pedazo in pedazos:
+        pedazo = resto + pedazo.lower()
+        resto = ""
+        for coincidencia in PATRON_TOKEN.finditer(pedazo):
+            token = coincidencia.group()
+            if coincidencia.end() == len(pedazo) and token not in FIN_DE_CLAUSULA:
+                resto = token
+            else:
+                yield token
+    if resto:
+        yield resto
+
+def _ultimo_corte_exacto(tokens: List[str], lexico: LexicoCompilado) -> int:
+    """
+    Última posición k tal que puntuar tokens[:k] y tokens[k:] por separado da
+    lo mismo que puntuarlos juntos: k no cae dentro de una frase ni en la
+    ventana de un modificador, y ninguna frase anterior podría continuar más
+    allá del final. Devuelve 0 si no hay ninguna.
+    """
+    ventana = VENTANA_MODIFICADORES
+    memo = lexico.memo
+    buscar = lexico.buscar
+    n = len(tokens)
+    corte = 0
+    modificador = None  # posición final del último modificador de la cláusula
+    i = 0
+    while i < n:
+        if modificador is None or modificador < i - ventana:
+            corte = i
+        token = tokens[i]
+        if token in FIN_DE_CLAUSULA:
+            modificador = None
+            i += 1
+            continue
+        # El mismo recorrido que emparejar_tokens
+        entrada, continua = memo.get(token) or buscar(token)
+        fin = i
+        j = i
+        frase = token
+        while continua:
+            if j + 1 == n:
+                return corte  # la frase podría seguir en el próximo segmento
+            j += 1
+            frase = f"{frase} {tokens[j]}"
+            candidata, continua = buscar(frase)
+            if candidata is not None:
+                entrada, fin = candidata, j
+        if entrada is not None and entrada.modificador is not None:
+            modificador = fin
+        i = fin + 1
+    return n if modificador is None or modificador < n - ventana else corte
+
+def segmentar_tokens(tokens: Iterable[str], palabras_por_segmento: int = SEGMENTO_PALABRAS,
+                     lexico: Optional[LexicoCompilado] = None) -> Iterator[List[str]]:
+    """
+    Agrupa tokens en segmentos que terminan en el primer fin de oración tras
+    reunir `palabras_por_segmento` palabras (1 = oración a oración).
+    
+    Como ni las frases ni los modificadores cruzan un fin de oración, la
+    suma de las puntuaciones de los segmentos es la del texto completo. Un
+    texto sin puntuación se corta además cada max(2 × palabras_por_segmento,
+    SEGMENTO_PALABRAS) palabras; con `lexico` ese corte se adelanta al último
+    punto que no parte una frase ni la ventana de un modificador, y los
+    tokens restantes pasan al segmento siguiente. Sin `lexico`, o si no hay
+    tal punto (un segmento entero de modificadores encadenados), el corte
+    puede partirlos.
+    """
+    limite = max(2 * palabras_por_segmento, SEGMENTO_PALABRAS)
+    segmento = []
+    palabras = 0
+    for token in tokens:
+        segmento.append(token)
+        if token in FIN_DE_CLAUSULA:
+            if token in FIN_DE_ORACION and palabras >= palabras_por_segmento:
+                yield segmento
+                segmento, palabras = [], 0
+            continue
+        palabras += 1
+        if palabras >= limite:
+            corte = (_ultimo_corte_exacto(segmento, lexico) if lexico is not None else 0) or len(segmento)
+            yield segmento[:corte]
+            segmento = segmento[corte:]
+            palabras = sum(token not in FIN_DE_CLAUSULA for token in segmento)
+    if segmento:
+        yield segmento
+
+def puntuar_documento(fuente: Union[str, Iterable[str]], palabras_por_segmento: int = SEGMENTO_PALABRAS,
+                      umbral_confianza: Optional[float] = None,
+                      min_segmentos: int = MIN_SEGMENTOS_SALIDA) -> Iterator[SegmentoSentimiento]:
+    """
+    Puntúa un documento largo segmento a segmento con memoria acotada.
+    
+    Cada segmento se tokeniza, puntúa y descarta antes de leer el siguiente.
+    Los segmentos se cortan donde no se parte ninguna frase ni la ventana de
+    un modificador (ver segmentar_tokens), así que el acumulado (suma de
+    puntuaciones y de palabras) da en cada paso el mismo resultado que
+    analizar_sentimiento sobre lo leído hasta ahí.
+    
+    Args:
+        fuente: Texto o iterable de pedazos de texto (ej. un archivo abierto)
+        palabras_por_segmento: Tamaño aproximado de cada segmento (1 = por oración)
+        umbral_confianza: Si se indica, se deja de leer cuando la confianza
+            acumulada lo alcanza (tras `min_segmentos` segmentos)
+        min_segmentos: Segmentos mínimos antes de la salida anticipada
+        
+    Yields:
+        SegmentoSentimiento por segmento, en orden
+    """
+    lexico = fuente_lexico.actual()  # el mismo léxico para todo el documento
+    bruta_acumulada = 0.0
+    total_acumulado = 0
+    posicion = 0
+    for indice, tokens in enumerate(segmentar_tokens(tokens_por_pedazos(fuente), palabras_por_segmento, lexico)):
+        puntuado = puntuar_tokens(tokens, lexico)
+        total = puntuado.estadisticas["total"]
+        bruta_acumulada += puntuado.puntuacion
+        total_acumulado += total
+        sentimiento, confianza = determinar_sentimiento_y_confianza(puntuado.puntuacion, total) if total else (None, 0.0)
+        acumulado, confianza_acumulada = (
+            determinar_sentimiento_y_confianza(bruta_acumulada, total_acumulado) if total_acumulado else (None, 0.0)
+        )
+        palabras = sum(token not in FIN_DE_CLAUSULA for token in tokens)
+        salida = (umbral_confianza is not None and indice + 1 >= min_segmentos
+                  and confianza_acumulada >= umbral_confianza)
+        yield SegmentoSentimiento(
+            indice=indice,
+            desde_palabra=posicion,
+            hasta_palabra=posicion + palabras,
+            sentimiento=sentimiento,
+            confianza=confianza,
+            puntuacion=puntuado.puntuacion / total if total else 0.0,
+            palabras_clave=puntuado.palabras_clave,
+            estadisticas=puntuado.estadisticas,
+            sentimiento_acumulado=acumulado,
+            confianza_acumulada=confianza_acumulada,
+            puntuacion_acumulada=bruta_acumulada / total_acumulado if total_acumulado else 0.0,
+            salida_anticipada=salida,
+        )
+        posicion += palabras
+        if salida:
+            return
+
+class LineaTemporal:
+    """
+    Evolución del sentimiento de un documento en como mucho `maximo` tramos.
+    
+    Cada tramo agrupa segmentos consecutivos. Cuando hay más de `maximo`
+    tramos se fusionan de dos en dos y los siguientes abarcan el doble de
+    segmentos, así que el tamaño no depende del largo del documento.
+    """
+    
+    def __init__(self, maximo: int = MAX_TRAMOS_LINEA_TEMPORAL):
+        self.maximo = maximo
+        self.segmentos_por_tramo = 1
+        # [primer segmento, último segmento, desde palabra, hasta palabra,
+        #  puntuación bruta, palabras válidas, sentimiento acumulado al final]
+        self._tramos: List[list] = []
+    
+    def agregar(self, segmento: SegmentoSentimiento):
+        total = segmento.estadisticas["total"]
+        tramo = self._tramos[-1] if self._tramos else None
+        if tramo is None or tramo[1] - tramo[0] + 1 >= self.segmentos_por_tramo:
+            self._tramos.append([segmento.indice, segmento.indice, segmento.desde_palabra, segmento.hasta_palabra,
+                                 segmento.puntuacion * total, total, segmento.sentimiento_acumulado])
+            if len(self._tramos) > self.maximo:
+                self._fusionar()
+            return
+        tramo[1] = segmento.indice
+        tramo[3] = segmento.hasta_palabra
+        tramo[4] += segmento.puntuacion * total
+        tramo[5] += total
+        tramo[6] = segmento.sentimiento_acumulado
+    
+    def _fusionar(self):
+        self.segmentos_por_tramo *= 2
+        fusionados = []
+        for i in range(0, len(self._tramos), 2):
+            primero, *resto = self._tramos[i:i + 2]
+            for segundo in resto:
+                primero[1], primero[3] = segundo[1], segundo[3]
+                primero[4] += segundo[4]
+                primero[5] += segundo[5]
+                primero[6] = segundo[6]
+            fusionados.append(primero)
+        self._tramos = fusionados
+    
+    def puntos(self) -> List[Dict[str, any]]:
+        puntos = []
+        for primero, ultimo, desde, hasta, bruta, total, acumulado in self._tramos:
+            sentimiento, confianza = determinar_sentimiento_y_confianza(bruta, total) if total else (None, 0.0)
+            puntos.append({
+                "segmentos": f"{primero + 1}-{ultimo + 1}" if ultimo > primero else str(primero + 1),
+                "palabras": f"{desde + 1}-{hasta}",
+                "sentimiento": sentimiento,
+                "confianza": round(confianza, 3),
+                "puntuacion": round(bruta / total, 3) if total else 0.0,
+                "sentimiento_acumulado": acumulado,
+            })
+        return puntos
+
+# -------------------------
+# API Directa
+# -------------------------
+
+def analizar_textos(textos: List[str], con_detalle: bool = True, sesion: Optional[str] = None) -> Dict[str, any]:
+    """
+    Analiza textos con el motor léxico directamente, sin pasar por el LLM.
+    
+    Hace el mismo cálculo que las herramientas del agente, por lotes, y
+    devuelve un diccionario listo para serializar a JSON (lo usa
+    servidor_sentimiento.py). El LLM solo hace falta para interpretar los
+    resultados en una conversación.
+    
+    Args:
+        textos: Textos a analizar
+        con_detalle: Si True, incluye palabras clave y estadísticas de cada texto
+        sesion: Si se indica, guarda los análisis en el historial de esa sesión
+        
+    Returns:
+        Diccionario con "resultados" (uno por texto, en orden), la
+        distribución de sentimientos, la confianza promedio y la versión
+        del léxico usado
+    """
+    lote = puntuar_lote(textos, con_detalle=con_detalle or sesion is not None)
+    resultados = []
+    for i, texto in enumerate(textos):
+        sentimiento = lote.sentimientos[i]
+        if sentimiento is None:
+            resultados.append({"sentimiento": None, "error": "No se encontraron palabras válidas en el texto."})
+            continue
+        resultado = {
+            "sentimiento": sentimiento,
+            "confianza": round(lote.confianzas[i], 3),
+            "puntuacion": round(lote.puntuaciones[i], 3),
+        }
+        if con_detalle:
+            resultado["palabras_clave"] = lote.palabras_clave[i]
+            resultado["estadisticas"] = lote.estadisticas[i]
+        resultados.append(resultado)
+        if sesion is not None:
+            registrar_analisis(AnalisisResultado(
+                texto_original=texto,
+                sentimiento=sentimiento,
+                confianza=lote.confianzas[i],
+                palabras_clave=lote.palabras_clave[i],
+                puntuacion=lote.puntuaciones[i],
+                estadisticas=lote.estadisticas[i]
+            ), sesion=sesion)
+    return {
+        "resultados": resultados,
+        "analizados": lote.analizados,
+        "distribucion_sentimientos": lote.distribucion,
+        "confianza_promedio": round(lote.confianza_promedio, 3),
+        "version_lexico": fuente_lexico.actual().version,
+    }
+
+def analizar_texto(texto: str, con_detalle: bool = True, sesion: Optional[str] = None) -> Dict[str, any]:
+    """Resultado de analizar_textos para un solo texto."""
+    return analizar_textos([texto], con_detalle, sesion)["resultados"][0]
+
 # -------------------------
 # Herramientas del Agente
 # -------------------------
 
-def analizar_sentimiento(texto: str) -> Dict[str, any]:
+def analizar_sentimiento(texto: str, tool_context: ToolContext = None) -> Dict[str, any]:
     """
     Analiza el sentimiento de un texto en español usando análisis léxico.
     
     Args:
         texto: Texto a analizar
+        tool_context: Contexto de ADK; identifica la sesión cuyo historial se actualiza
         
     Returns:
         Diccionario con:
@@ -245,30 +2142,33 @@ def analizar_sentimiento(texto: str) -> Dict[str, any]:
         - estadisticas: contador de tipos de palabras
     """
     logger.info(f"🔍 Analizando sentimiento del texto: '{texto[:50]}...'")
-    
+    return _analizar_sentimiento(texto, tool_context)[0]
+
+def _analizar_sentimiento(texto: str, tool_context: Optional[ToolContext] = None
+                          ) -> Tuple[Dict[str, any], Optional[PuntuacionTexto]]:
+    """Cuerpo de analizar_sentimiento; devuelve además la puntuación para reutilizarla."""
     if not texto or not texto.strip():
         return {
             "status": "error",
             "message": "❌ El texto no puede estar vacío."
-        }
+        }, None
     
-    # Procesar texto
-    palabras = obtener_palabras(texto)
+    # Tokenizar y puntuar en una sola pasada (o reutilizar un resultado previo)
+    puntuado = cache_puntuaciones.puntuar(texto)
+    estadisticas = puntuado.estadisticas
+    total_palabras = estadisticas["total"]
     
-    if not palabras:
+    if not total_palabras:
         return {
             "status": "error",
             "message": "❌ No se encontraron palabras válidas en el texto."
-        }
-    
-    # Calcular puntuación base
-    puntuacion_base, palabras_clave, estadisticas = calcular_puntuacion_base(palabras)
+        }, None
     
-    # Aplicar modificadores
-    puntuacion_final = aplicar_modificadores(texto, puntuacion_base)
+    palabras_clave = list(puntuado.palabras_clave)  # el original vive en la caché
+    puntuacion_final = puntuado.puntuacion
     
     # Determinar sentimiento y confianza
-    sentimiento, confianza = determiner_sentimiento_y_confianza(puntuacion_final, len(palabras))
+    sentimiento, confianza = determinar_sentimiento_y_confianza(puntuacion_final, total_palabras)
     
     # Crear resultado
     resultado = AnalisisResultado(
@@ -276,20 +2176,17 @@ def analizar_sentimiento(texto: str) -> Dict[str, any]:
         sentimiento=sentimiento,
         confianza=confianza,
         palabras_clave=palabras_clave,
-        puntuacion=puntuacion_final / len(palabras) if len(palabras) > 0 else 0,
+        puntuacion=puntuacion_final / total_palabras,
         estadisticas=estadisticas
     )
     
-    # Agregar al historial
-    historial.agregar(resultado)
-    
-    # Preparar respuesta
-    emoji_sentimiento = {"positivo": "😊", "negativo": "😞", "neutral": "😐"}
+    # Agregar al historial de la sesión
+    registrar_analisis(resultado, tool_context)
     
     return {
         "status": "success",
         "sentimiento": sentimiento,
-        "emoji": emoji_sentimiento[sentimiento],
+        "emoji": EMOJI_SENTIMIENTO[sentimiento],
         "confianza": round(confianza, 3),
         "confianza_porcentaje": f"{round(confianza * 100, 1)}%",
         "puntuacion": round(resultado.puntuacion, 3),
@@ -302,14 +2199,15 @@ def analizar_sentimiento(texto: str) -> Dict[str, any]:
         },
         "interpretacion": generar_interpretacion(sentimiento, confianza, estadisticas),
         "texto_analizado": texto[:100] + "..." if len(texto) > 100 else texto
-    }
+    }, puntuado
 
-def analizar_texto_multiple(textos: List[str]) -> Dict[str, any]:
+def analizar_texto_multiple(textos: List[str], tool_context: ToolContext = None) -> Dict[str, any]:
     """
     Analiza múltiples textos y proporciona estadísticas comparativas.
     
     Args:
         textos: Lista de textos a analizar
+        tool_context: Contexto de ADK; identifica la sesión cuyo historial se actualiza
         
     Returns:
         Análisis individual y estadísticas comparativas
@@ -322,23 +2220,28 @@ def analizar_texto_multiple(textos: List[str]) -> Dict[str, any]:
             "message": "❌ Debe proporcionar al menos un texto."
         }
     
+    lote = puntuar_lote(textos, con_detalle=True)
     resultados = []
-    sentimientos = []
-    confianzas = []
     
     for i, texto in enumerate(textos):
-        if texto.strip():
-            resultado = analizar_sentimiento(texto)
-            if resultado["status"] == "success":
-                resultados.append({
-                    "indice": i + 1,
-                    "texto": texto[:50] + "..." if len(texto) > 50 else texto,
-                    "sentimiento": resultado["sentimiento"],
-                    "confianza": resultado["confianza"],
-                    "emoji": resultado["emoji"]
-                })
-                sentimientos.append(resultado["sentimiento"])
-                confianzas.append(resultado["confianza"])
+        sentimiento = lote.sentimientos[i]
+        if sentimiento is None:
+            continue
+        registrar_analisis(AnalisisResultado(
+            texto_original=texto,
+            sentimiento=sentimiento,
+            confianza=lote.confianzas[i],
+            palabras_clave=lote.palabras_clave[i],
+            puntuacion=lote.puntuaciones[i],
+            estadisticas=lote.estadisticas[i]
+        ), tool_context)
+        resultados.append({
+            "indice": i + 1,
+            "texto": texto[:50] + "..." if len(texto) > 50 else texto,
+            "sentimiento": sentimiento,
+            "confianza": round(lote.confianzas[i], 3),
+            "emoji": EMOJI_SENTIMIENTO[sentimiento]
+        })
     
     if not resultados:
         return {
@@ -347,8 +2250,8 @@ def analizar_texto_multiple(textos: List[str]) -> Dict[str, any]:
         }
     
     # Estadísticas comparativas
-    distribucion = Counter(sentimientos)
-    confianza_promedio = sum(confianzas) / len(confianzas)
+    distribucion = Counter(lote.distribucion)
+    confianza_promedio = lote.confianza_promedio
     
     return {
         "status": "success",
@@ -364,60 +2267,305 @@ def analizar_texto_multiple(textos: List[str]) -> Dict[str, any]:
         "resumen": generar_resumen_multiple(distribucion, confianza_promedio)
     }
 
-def obtener_historial_analisis(limite: Optional[int] = 10) -> Dict[str, any]:
+def analizar_corpus(textos: List[str], procesos: Optional[int] = None) -> Dict[str, any]:
+    """
+    Analiza un corpus grande en paralelo y devuelve solo estadísticas agregadas.
+    
+    A diferencia de analizar_texto_multiple, no devuelve resultados por texto
+    ni los guarda en el historial.
+    
+    Args:
+        textos: Lista de textos a analizar
+        procesos: Número de procesos a usar (por defecto y como máximo, los núcleos disponibles)
+        
+    Returns:
+        Distribución de sentimientos, confianza y puntuación promedio del corpus
+    """
+    logger.info(f"🏭 Analizando corpus de {len(textos)} textos")
+    nucleos = os.cpu_count() or 1
+    procesos = max(1, min(procesos or nucleos, nucleos))
+    
+    if not textos:
+        return {
+            "status": "error",
+            "message": "❌ Debe proporcionar al menos un texto."
+        }
+    
+    # Corpus pequeños no compensan el arranque de procesos
+    if len(textos) <= TAMANO_BLOQUE_CORPUS:
+        procesos = 1
+    agregado = procesar_corpus(textos, procesos)
+    
+    if not agregado.analizados:
+        return {
+            "status": "error",
+            "message": "❌ No se pudieron analizar los textos proporcionados."
+        }
+    
+    return {
+        "status": "success",
+        "total_textos": agregado.total_textos,
+        "textos_analizados": agregado.analizados,
+        "distribucion_sentimientos": dict(agregado.distribucion),
+        "sentimiento_predominante": agregado.distribucion.most_common(1)[0][0],
+        "confianza_promedio": round(agregado.confianza_promedio, 3),
+        "puntuacion_promedio": round(agregado.puntuacion_promedio, 3),
+        "resumen": generar_resumen_multiple(agregado.distribucion, agregado.confianza_promedio)
+    }
+
+def analizar_documento_largo(texto: str, palabras_por_segmento: int = SEGMENTO_PALABRAS,
+                             umbral_confianza: Optional[float] = None,
+                             tool_context: ToolContext = None) -> Dict[str, any]:
     """
-    Obtiene el historial de análisis realizados.
+    Analiza un documento largo (artículo, transcripción) por segmentos y
+    devuelve el sentimiento global y su evolución a lo largo del texto.
+    
+    Args:
+        texto: Documento a analizar
+        palabras_por_segmento: Palabras aproximadas por segmento (1 = oración a oración)
+        umbral_confianza: Confianza (0-1) a partir de la cual se deja de leer, opcional
+        tool_context: Contexto de ADK; identifica la sesión cuyo historial se actualiza
+        
+    Returns:
+        Sentimiento global, línea temporal (como mucho 20 tramos de segmentos
+        consecutivos) y las palabras clave más frecuentes
+    """
+    logger.info(f"📄 Analizando documento largo ({len(texto or '')} caracteres, segmentos de {palabras_por_segmento} palabras)")
+    
+    if not texto or not texto.strip():
+        return {
+            "status": "error",
+            "message": "❌ El texto no puede estar vacío."
+        }
+    if umbral_confianza is not None and not 0 < umbral_confianza <= 1:
+        return {
+            "status": "error",
+            "message": "❌ umbral_confianza debe estar entre 0 y 1."
+        }
+    
+    linea_temporal = LineaTemporal()
+    palabras_clave = Counter()
+    estadisticas = Counter()
+    ultimo = None
+    for segmento in puntuar_documento(texto, max(1, palabras_por_segmento or SEGMENTO_PALABRAS), umbral_confianza):
+        ultimo = segmento
+        palabras_clave.update(segmento.palabras_clave)
+        estadisticas.update(segmento.estadisticas)
+        linea_temporal.agregar(segmento)
+    
+    if ultimo is None or ultimo.sentimiento_acumulado is None:
+        return {
+            "status": "error",
+            "message": "❌ No se encontraron palabras válidas en el texto."
+        }
+    
+    sentimiento = ultimo.sentimiento_acumulado
+    confianza = ultimo.confianza_acumulada
+    frecuentes = palabras_clave.most_common(MAX_PALABRAS_CLAVE_DOCUMENTO)
+    # El documento cuenta una vez por palabra clave, como una reseña, en las palabras frecuentes
+    registrar_analisis(AnalisisResultado(
+        texto_original=texto,
+        sentimiento=sentimiento,
+        confianza=confianza,
+        palabras_clave=[palabra for palabra, _ in frecuentes],
+        puntuacion=ultimo.puntuacion_acumulada,
+        estadisticas=dict(estadisticas)
+    ), tool_context)
+    
+    return {
+        "status": "success",
+        "sentimiento": sentimiento,
+        "emoji": EMOJI_SENTIMIENTO[sentimiento],
+        "confianza": round(confianza, 3),
+        "confianza_porcentaje": f"{round(confianza * 100, 1)}%",
+        "puntuacion": round(ultimo.puntuacion_acumulada, 3),
+        "palabras_analizadas": ultimo.hasta_palabra,
+        "segmentos_analizados": ultimo.indice + 1,
+        "segmentos_por_tramo": linea_temporal.segmentos_por_tramo,
+        "analisis_completo": not ultimo.salida_anticipada,
+        "palabras_clave_frecuentes": [{"palabra": p, "apariciones": n} for p, n in frecuentes],
+        "linea_temporal": linea_temporal.puntos(),
+        "interpretacion": generar_interpretacion(sentimiento, confianza, estadisticas)
+            + ("" if not ultimo.salida_anticipada else
+               f" Se alcanzó la confianza pedida tras {ultimo.hasta_palabra} palabras y no se leyó el resto.")
+    }
+
+def obtener_historial_analisis(limite: Optional[int] = 10, desde: Optional[str] = None,
+                               hasta: Optional[str] = None, agrupar_por: Optional[str] = None,
+                               tool_context: ToolContext = None) -> Dict[str, any]:
+    """
+    Obtiene el historial de análisis realizados en la sesión actual.
     
     Args:
         limite: Número máximo de análisis a mostrar
+        desde: Fecha/hora ISO inicial (ej. "2024-05-01" o "2024-05-01T10:00"), opcional
+        hasta: Fecha/hora ISO final (excluida), opcional
+        agrupar_por: "hora" o "dia" para incluir totales por periodo, opcional
+        tool_context: Contexto de ADK; identifica la sesión
         
     Returns:
         Historial de análisis con estadísticas
     """
-    logger.info(f"📈 Obteniendo historial (límite: {limite})")
+    logger.info(f"📈 Obteniendo historial (límite: {limite}, desde: {desde}, hasta: {hasta})")
     
-    if not historial.analisis:
+    if agrupar_por is not None and agrupar_por not in AGRUPACIONES_HISTORIAL:
+        return {
+            "status": "error",
+            "message": f"❌ agrupar_por debe ser uno de: {', '.join(AGRUPACIONES_HISTORIAL)}."
+        }
+    try:
+        inicio = datetime.fromisoformat(desde).timestamp() if desde else None
+        fin = datetime.fromisoformat(hasta).timestamp() if hasta else None
+    except ValueError:
+        return {
+            "status": "error",
+            "message": "❌ Las fechas deben tener formato ISO, por ejemplo 2024-05-01T10:00."
+        }
+    historial = historiales.obtener(sesion_de(tool_context))
+    almacen = historial.almacen
+    if almacen is None and (inicio is not None or fin is not None or agrupar_por):
+        return {
+            "status": "error",
+            "message": "❌ Las consultas por fecha requieren el historial persistente (SENTIMIENTO_HISTORIAL_DB)."
+        }
+    
+    if almacen is not None:
+        recientes = almacen.recientes(limite, inicio, fin, historial.sesion)
+    else:
+        recientes = historial.recientes(limite)
+    
+    if not recientes:
         return {
             "status": "empty",
             "message": "📝 No hay análisis en el historial.",
             "sugerencia": "Realiza algunos análisis de sentimientos para ver el historial."
         }
     
-    # Obtener análisis recientes
-    analisis_recientes = historial.analisis[-limite:] if limite else historial.analisis
-    
     resultados_historial = []
-    for i, analisis in enumerate(reversed(analisis_recientes), 1):
+    for i, analisis in enumerate(recientes, 1):
         resultados_historial.append({
             "orden": i,
-            "texto": analisis.texto_original[:60] + "..." if len(analisis.texto_original) > 60 else analisis.texto_original,
+            "texto": analisis.extracto,
             "sentimiento": analisis.sentimiento,
             "confianza": f"{round(analisis.confianza * 100, 1)}%",
-            "timestamp": analisis.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-            "palabras_clave": len(analisis.palabras_clave)
+            "timestamp": datetime.fromtimestamp(analisis.timestamp).strftime("%Y-%m-%d %H:%M:%S"),
+            "palabras_clave": analisis.num_palabras_clave
         })
     
     estadisticas_globales = historial.obtener_estadisticas_globales()
     
-    return {
+    respuesta = {
         "status": "success",
         "historial_reciente": resultados_historial,
         "estadisticas_globales": estadisticas_globales,
         "total_mostrado": len(resultados_historial),
         "mensaje": f"📊 Mostrando {len(resultados_historial)} análisis más recientes"
     }
+    if inicio is not None or fin is not None:
+        respuesta["estadisticas_periodo"] = almacen.agregados(None, inicio, fin, historial.sesion)
+    if agrupar_por:
+        respuesta["por_periodo"] = almacen.agregados(agrupar_por, inicio, fin, historial.sesion)
+    return respuesta
+
+def obtener_palabras_frecuentes(periodo: str = "hora", limite: int = 10) -> Dict[str, any]:
+    """
+    Obtiene las palabras clave positivas y negativas más frecuentes del periodo.
+    
+    Args:
+        periodo: "hora" (última hora) o "dia" (últimas 24 horas)
+        limite: Número máximo de palabras por polaridad
+        
+    Returns:
+        Palabras más frecuentes con sus apariciones aproximadas
+    """
+    logger.info(f"🔤 Obteniendo palabras frecuentes (periodo: {periodo}, límite: {limite})")
+    
+    if periodo not in PERIODOS_PALABRAS:
+        return {
+            "status": "error",
+            "message": f"❌ periodo debe ser uno de: {', '.join(PERIODOS_PALABRAS)}."
+        }
+    if historial_global is None:
+        return {
+            "status": "error",
+            "message": "❌ Las palabras frecuentes requieren el agregado global (SENTIMIENTO_AGREGADO_GLOBAL)."
+        }
+    frecuentes = historial_global.mas_frecuentes(periodo, max(1, limite or 10))
+    if not frecuentes["total_apariciones"]:
+        return {
+            "status": "empty",
+            "message": f"📝 No hay palabras clave analizadas en el periodo ({periodo}).",
+            "sugerencia": "Realiza algunos análisis de sentimientos para ver las palabras frecuentes."
+        }
+    
+    return {
+        "status": "success",
+        "periodo": periodo,
+        "positivas": [{"palabra": p, "apariciones": n} for p, n in frecuentes["positivas"]],
+        "negativas": [{"palabra": p, "apariciones": n} for p, n in frecuentes["negativas"]],
+        "total_apariciones": frecuentes["total_apariciones"],
+        "nota": "Conteos aproximados (Count-Min sketch): pueden exceder ligeramente el valor real.",
+        "mensaje": f"🔤 Palabras clave más frecuentes ({periodo})"
+    }
 
-def limpiar_historial() -> Dict[str, any]:
+def obtener_tendencia_sentimiento(ultimos_minutos: int = 15, resolucion: Optional[str] = None) -> Dict[str, any]:
     """
-    Limpia el historial de análisis.
+    Obtiene la evolución del sentimiento en los últimos minutos, horas o días.
     
+    Args:
+        ultimos_minutos: Amplitud de la ventana (ej. 15, 60 o 1440 para un día)
+        resolucion: "minuto", "hora" o "dia" para la serie, opcional (la serie tiene
+            como mucho 60 puntos; con más cubetas se agrupan)
+        
+    Returns:
+        Distribución y confianza promedio de la ventana, con su serie temporal
+    """
+    logger.info(f"📉 Obteniendo tendencia (últimos {ultimos_minutos} minutos, resolución: {resolucion})")
+    
+    if resolucion is not None and resolucion not in RESOLUCIONES_TENDENCIA:
+        return {
+            "status": "error",
+            "message": f"❌ resolucion debe ser una de: {', '.join(RESOLUCIONES_TENDENCIA)}."
+        }
+    if not ultimos_minutos or ultimos_minutos <= 0:
+        return {
+            "status": "error",
+            "message": "❌ ultimos_minutos debe ser mayor que 0."
+        }
+    
+    if historial_global is None:
+        return {
+            "status": "error",
+            "message": "❌ Las tendencias requieren el agregado global (SENTIMIENTO_AGREGADO_GLOBAL)."
+        }
+    tendencia = historial_global.tendencia(ultimos_minutos * 60, resolucion)
+    if not tendencia["total_analisis"]:
+        return {
+            "status": "empty",
+            "message": f"📝 No hay análisis en los últimos {ultimos_minutos} minutos.",
+            "sugerencia": "Realiza algunos análisis de sentimientos para ver la tendencia."
+        }
+    
+    return {
+        "status": "success",
+        "ultimos_minutos": ultimos_minutos,
+        **tendencia,
+        "mensaje": f"📉 Tendencia de los últimos {ultimos_minutos} minutos por {tendencia['resolucion']}"
+    }
+
+def limpiar_historial(tool_context: ToolContext = None) -> Dict[str, any]:
+    """
+    Limpia el historial de análisis de la sesión actual.
+    
+    Args:
+        tool_context: Contexto de ADK; identifica la sesión
+        
     Returns:
         Confirmación de la operación
     """
     logger.info("🧹 Limpiando historial")
     
-    total_analisis = len(historial.analisis)
-    historial.analisis.clear()
+    total_analisis = historiales.obtener(sesion_de(tool_context)).limpiar()
     
     return {
         "status": "success",
@@ -425,42 +2573,29 @@ def limpiar_historial() -> Dict[str, any]:
         "analisis_eliminados": total_analisis
     }
 
-def analizar_emociones_avanzado(texto: str) -> Dict[str, any]:
+def analizar_emociones_avanzado(texto: str, tool_context: ToolContext = None) -> Dict[str, any]:
     """
     Análisis avanzado que identifica emociones específicas más allá del sentimiento básico.
     
     Args:
         texto: Texto a analizar
+        tool_context: Contexto de ADK; identifica la sesión cuyo historial se actualiza
         
     Returns:
         Análisis detallado de emociones
     """
     logger.info(f"🎭 Análisis avanzado de emociones")
     
-    # Diccionarios de emociones específicas
-    emociones = {
-        "alegría": ["feliz", "alegre", "contento", "eufórico", "radiante", "jubiloso"],
-        "tristeza": ["triste", "deprimido", "melancólico", "desanimado", "abatido"],
-        "enojo": ["enojado", "furioso", "iracundo", "molesto", "irritado", "indignado"],
-        "miedo": ["miedo", "temor", "pánico", "terror", "asustado", "atemorizado"],
-        "sorpresa": ["sorprendido", "asombrado", "impactado", "atónito", "pasmado"],
-        "disgusto": ["asco", "repugnancia", "aversión", "disgusto", "náusea"]
-    }
-    
-    palabras = obtener_palabras(texto)
-    emociones_detectadas = {}
-    
-    for emocion, palabras_emocion in emociones.items():
-        count = sum(1 for palabra in palabras if palabra in palabras_emocion)
-        if count > 0:
-            emociones_detectadas[emocion] = count
-    
-    # Análisis básico también
-    analisis_basico = analizar_sentimiento(texto)
+    # Sentimiento y emociones salen de la misma pasada del motor
+    analisis_basico, puntuado = _analizar_sentimiento(texto, tool_context)
     
     if analisis_basico["status"] != "success":
         return analisis_basico
     
+    emociones_detectadas = {
+        emocion: puntuado.emociones[emocion] for emocion in EMOCIONES if emocion in puntuado.emociones
+    }
+    
     return {
         "status": "success",
         "sentimiento_general": analisis_basico["sentimiento"],
@@ -543,7 +2678,11 @@ root_agent = Agent(
         "- Análisis de sentimiento básico (positivo/negativo/neutral)\n"
         "- Análisis avanzado de emociones específicas (alegría, tristeza, enojo, etc.)\n"
         "- Procesamiento de múltiples textos con estadísticas comparativas\n"
-        "- Gestión de historial de análisis con tendencias\n"
+        "- Documentos largos por segmentos, con la evolución del sentimiento (analizar_documento_largo)\n"
+        "- Análisis de corpus grandes en paralelo (analizar_corpus) cuando solo interesan los totales\n"
+        "- Gestión de historial de análisis con tendencias (cada sesión tiene el suyo)\n"
+        "- Palabras que más pesan en el sentimiento de la última hora o día (obtener_palabras_frecuentes)\n"
+        "- Tendencia del sentimiento en los últimos minutos, horas o días (obtener_tendencia_sentimiento)\n"
         "- Interpretación contextual y recomendaciones\n\n"
         "🔍 METODOLOGÍA:\n"
         "- Uso diccionarios léxicos especializados en español\n"
@@ -570,7 +2709,11 @@ root_agent = Agent(
     tools=[
         analizar_sentimiento,
         analizar_texto_multiple, 
+        analizar_corpus,
+        analizar_documento_largo,
         obtener_historial_analisis,
+        obtener_palabras_frecuentes,
+        obtener_tendencia_sentimiento,
         limpiar_historial,
         analizar_emociones_avanzado
     ],
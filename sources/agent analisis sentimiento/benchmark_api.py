@@ -0,0 +1,201 @@
+"""
+Benchmark de throughput: motor de sentimientos directo frente al agente con LLM.
+
+Mide textos/s y latencia por petición de cada camino hasta el motor léxico:
+
+- api directa: agent.analizar_textos en el mismo proceso (por texto y por lotes)
+- http: servidor_sentimiento.py en otro proceso, con conexiones keep-alive
+- adk herramienta: FunctionTool.run_async de analizar_sentimiento, sin modelo
+- llm: el agente sentiment_analyzer_spanish completo vía InMemoryRunner
+  (solo con --llm N y credenciales de Gemini, p. ej. GOOGLE_API_KEY)
+
+Uso:
+    python benchmark_api.py --textos 5000 --lote 100 --conexiones 1,4
+    python benchmark_api.py --llm 5 --json resultados.json
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, DIRECTORIO)
+os.environ.setdefault("SENTIMIENTO_HISTORIAL_DB", "")  # sin escrituras a disco durante la medida
+import agent
+from benchmark_sentimiento import generar_corpus
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_servidor() -> tuple:
+    """Arranca servidor_sentimiento.py en otro proceso para no competir por el GIL con el cliente."""
+    puerto = _puerto_libre()
+    proceso = subprocess.Popen(
+        [sys.executable, os.path.join(DIRECTORIO, "servidor_sentimiento.py"), "--port", str(puerto)],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        env={**os.environ, "SENTIMIENTO_HISTORIAL_DB": ""},
+    )
+    proceso.stdout.readline()  # espera al mensaje de arranque
+    return proceso, puerto
+
+
+def _lotes(corpus: list, tamano: int) -> list:
+    return [corpus[i:i + tamano] for i in range(0, len(corpus), tamano)]
+
+
+def resumir(nombre: str, textos: int, duracion: float, latencias: list) -> dict:
+    latencias.sort()
+    fila = {
+        "camino": nombre,
+        "textos": textos,
+        "textos_por_s": round(textos / duracion, 1),
+        "p50_ms": round(statistics.median(latencias) * 1000, 3),
+        "p95_ms": round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] * 1000, 3),
+    }
+    print(f"{nombre:<28} {fila['textos_por_s']:>12.1f} textos/s | "
+          f"p50 {fila['p50_ms']:>10.3f} ms | p95 {fila['p95_ms']:>10.3f} ms por petición", flush=True)
+    return fila
+
+
+def medir_directo(corpus: list, tamano_lote: int) -> dict:
+    latencias = []
+    inicio = time.perf_counter()
+    for lote in _lotes(corpus, tamano_lote):
+        antes = time.perf_counter()
+        agent.analizar_textos(lote)
+        latencias.append(time.perf_counter() - antes)
+    return resumir(f"api directa (lote {tamano_lote})", len(corpus), time.perf_counter() - inicio, latencias)
+
+
+def medir_http(puerto: int, corpus: list, tamano_lote: int, conexiones: int) -> dict:
+    pendientes = iter(_lotes(corpus, tamano_lote))
+    candado = threading.Lock()
+    latencias = []
+
+    def cliente():
+        conexion = http.client.HTTPConnection("127.0.0.1", puerto)
+        while True:
+            with candado:
+                lote = next(pendientes, None)
+            if lote is None:
+                break
+            cuerpo = json.dumps({"textos": lote}).encode("utf-8")
+            antes = time.perf_counter()
+            conexion.request("POST", "/analizar", cuerpo, {"Content-Type": "application/json"})
+            respuesta = conexion.getresponse()
+            datos = json.loads(respuesta.read())
+            latencias.append(time.perf_counter() - antes)
+            assert respuesta.status == 200 and len(datos["resultados"]) == len(lote), datos
+        conexion.close()
+
+    hilos = [threading.Thread(target=cliente) for _ in range(conexiones)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return resumir(f"http (lote {tamano_lote}, c={conexiones})", len(corpus), time.perf_counter() - inicio, latencias)
+
+
+async def _contexto_adk():
+    from google.adk.agents.invocation_context import InvocationContext
+    from google.adk.sessions import InMemorySessionService
+    from google.adk.tools.tool_context import ToolContext
+
+    servicio = InMemorySessionService()
+    sesion = await servicio.create_session(app_name="benchmark_api", user_id="benchmark")
+    contexto = InvocationContext(
+        session_service=servicio, invocation_id="benchmark", agent=agent.root_agent, session=sesion
+    )
+    herramientas = {h.name: h for h in await agent.root_agent.canonical_tools()}
+    return herramientas["analizar_sentimiento"], ToolContext(contexto)
+
+
+async def medir_herramienta_adk(corpus: list) -> dict:
+    herramienta, contexto = await _contexto_adk()
+    latencias = []
+    inicio = time.perf_counter()
+    for texto in corpus:
+        antes = time.perf_counter()
+        await herramienta.run_async(args={"texto": texto}, tool_context=contexto)
+        latencias.append(time.perf_counter() - antes)
+    return resumir("adk herramienta (sin LLM)", len(corpus), time.perf_counter() - inicio, latencias)
+
+
+async def medir_llm(corpus: list) -> dict:
+    """Cada texto es una conversación completa con el modelo, que llama a la herramienta."""
+    from google.adk.runners import InMemoryRunner
+    from google.genai import types
+
+    runner = InMemoryRunner(agent=agent.root_agent, app_name="benchmark_api")
+    latencias = []
+    tokens = 0
+    inicio = time.perf_counter()
+    for texto in corpus:
+        sesion = await runner.session_service.create_session(app_name="benchmark_api", user_id="benchmark")
+        mensaje = types.Content(role="user", parts=[types.Part(text=f"Analiza el sentimiento de este texto: {texto}")])
+        antes = time.perf_counter()
+        async for evento in runner.run_async(user_id="benchmark", session_id=sesion.id, new_message=mensaje):
+            if evento.usage_metadata and evento.usage_metadata.total_token_count:
+                tokens += evento.usage_metadata.total_token_count
+        latencias.append(time.perf_counter() - antes)
+    fila = resumir("llm (agente completo)", len(corpus), time.perf_counter() - inicio, latencias)
+    fila["tokens_por_texto"] = round(tokens / len(corpus), 1)
+    print(f"{'':<28} {fila['tokens_por_texto']} tokens por texto")
+    return fila
+
+
+def _credenciales_gemini() -> bool:
+    return bool(os.getenv("GOOGLE_API_KEY") or os.getenv("GOOGLE_GENAI_USE_VERTEXAI"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput del motor directo frente al agente con LLM")
+    parser.add_argument("--textos", type=int, default=5000)
+    parser.add_argument("--palabras", type=int, default=40, help="Palabras por reseña")
+    parser.add_argument("--lote", type=int, default=100, help="Textos por petición en los caminos por lotes")
+    parser.add_argument("--conexiones", type=lambda v: [int(n) for n in v.split(",")], default=[1, 4])
+    parser.add_argument("--llm", type=int, default=0, metavar="N", help="Mide también N textos con el agente y Gemini")
+    parser.add_argument("--json", help="Guarda los resultados en este archivo")
+    args = parser.parse_args()
+
+    logging.getLogger(agent.__name__).setLevel(logging.WARNING)
+    corpus = generar_corpus(args.textos, args.palabras)
+    print(f"{args.textos} reseñas de {args.palabras} palabras")
+
+    resultados = [medir_directo(corpus, 1), medir_directo(corpus, args.lote)]
+    proceso, puerto = iniciar_servidor()
+    try:
+        resultados.append(medir_http(puerto, corpus[:max(1, args.textos // 5)], 1, 1))
+        for conexiones in args.conexiones:
+            resultados.append(medir_http(puerto, corpus, args.lote, conexiones))
+    finally:
+        proceso.terminate()
+    resultados.append(asyncio.run(medir_herramienta_adk(corpus[:max(1, args.textos // 5)])))
+
+    if args.llm:
+        if _credenciales_gemini():
+            resultados.append(asyncio.run(medir_llm(corpus[:args.llm])))
+        else:
+            print("llm: omitido (sin GOOGLE_API_KEY ni GOOGLE_GENAI_USE_VERTEXAI)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark del motor léxico de sentimientos, sin LLM ni red.
+
+Genera reseñas sintéticas en español a partir de los diccionarios del agente
+y compara textos/s del pipeline original (limpiar, puntuar y volver a
+tokenizar para los modificadores) con el motor de una sola pasada. Antes de
+medir comprueba que ambos detectan las mismas palabras clave y estadísticas
+(la puntuación difiere: el motor aplica los modificadores por ventana).
+
+Con --lote mide además el análisis de un corpus completo: el bucle que usaba
+analizar_texto_multiple (analizar_sentimiento por texto) frente a
+puntuar_lote, vectorizado con NumPy. Con --procesos mide procesar_corpus
+con distintos números de procesos para ver cómo escala con los núcleos.
+
+Uso:
+    python benchmark_sentimiento.py --textos 2000 --palabras 400
+    python benchmark_sentimiento.py --lote --textos 100000 --palabras 40
+    python benchmark_sentimiento.py --procesos 1,2,4,8 --textos 200000 --palabras 40
+"""
+
+import argparse
+import logging
+import os
+import random
+import time
+
+os.environ.setdefault("SENTIMIENTO_HISTORIAL_DB", "")  # sin escrituras a disco durante la medida
+import agent
+
+RELLENO = [
+    "el", "la", "producto", "servicio", "llegó", "después", "de", "una", "semana", "pero",
+    "envío", "precio", "tienda", "compra", "pedido", "porque", "cuando", "también", "con", "para",
+]
+
+
+def generar_corpus(textos: int, palabras: int, semilla: int = 7) -> list:
+    """Reseñas con ~25% de palabras del léxico, puntuación y mayúsculas mezcladas."""
+    azar = random.Random(semilla)
+    lexico = sorted(agent.PALABRAS_POSITIVAS | agent.PALABRAS_NEGATIVAS | agent.PALABRAS_NEUTRALES)
+    lexico += sorted(agent.MODIFICADORES)
+    corpus = []
+    for _ in range(textos):
+        tokens = []
+        for n in range(palabras):
+            palabra = azar.choice(lexico) if azar.random() < 0.25 else azar.choice(RELLENO)
+            if n % 12 == 0:
+                palabra = palabra.capitalize()
+            tokens.append(palabra + ("," if n % 9 == 8 else "." if n % 17 == 16 else ""))
+        corpus.append(" ".join(tokens))
+    return corpus
+
+
+def pipeline_original(texto: str) -> tuple:
+    palabras = agent.obtener_palabras(texto)
+    base, palabras_clave, estadisticas = agent.calcular_puntuacion_base(palabras)
+    return agent.aplicar_modificadores(texto, base), palabras_clave, estadisticas
+
+
+def motor_fusionado(texto: str) -> tuple:
+    resultado = agent.puntuar_texto(texto)
+    return resultado.puntuacion, resultado.palabras_clave, resultado.estadisticas
+
+
+def bucle_analizar_sentimiento(corpus: list) -> None:
+    agent.cache_puntuaciones.limpiar()  # cada repetición mide textos nuevos, no aciertos de caché
+    for texto in corpus:
+        agent.analizar_sentimiento(texto)
+    agent.historiales.obtener(agent.SESION_LOCAL).limpiar()
+
+
+def medir_corpus(nombre: str, funcion, corpus: list, repeticiones: int) -> float:
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(corpus)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    velocidad = len(corpus) / mejor
+    print(f"{nombre:<22} {velocidad:>12.1f} textos/s | {mejor * 1000:9.1f} ms por corpus")
+    return velocidad
+
+
+def medir(nombre: str, funcion, corpus: list, repeticiones: int) -> float:
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for texto in corpus:
+            funcion(texto)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    velocidad = len(corpus) / mejor
+    print(f"{nombre:<22} {velocidad:>12.1f} textos/s | {mejor * 1000:9.1f} ms por corpus")
+    return velocidad
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del motor de sentimientos")
+    parser.add_argument("--textos", type=int, default=2000)
+    parser.add_argument("--palabras", type=int, default=400, help="Palabras por reseña")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--lote", action="store_true", help="Mide también el análisis de corpus completo")
+    parser.add_argument("--procesos", type=lambda v: [int(n) for n in v.split(",")], default=[],
+                        help="Mide procesar_corpus con estos números de procesos (ej. 1,2,4)")
+    args = parser.parse_args()
+
+    logging.getLogger(agent.__name__).setLevel(logging.WARNING)
+    corpus = generar_corpus(args.textos, args.palabras)
+
+    for texto in corpus[:200]:
+        esperado, obtenido = pipeline_original(texto)[1:], motor_fusionado(texto)[1:]
+        assert esperado == obtenido, (esperado, obtenido)
+
+    print(f"{args.textos} reseñas de {args.palabras} palabras")
+    original = medir("pipeline original", pipeline_original, corpus, args.repeticiones)
+    fusionado = medir("motor una pasada", motor_fusionado, corpus, args.repeticiones)
+    print(f"aceleración: x{fusionado / original:.2f}")
+
+    if args.lote:
+        motor = "numpy" if agent.np is not None else "python puro"
+        bucle = medir_corpus("bucle por texto", bucle_analizar_sentimiento, corpus, args.repeticiones)
+        lote = medir_corpus(f"puntuar_lote ({motor})", agent.puntuar_lote, corpus, args.repeticiones)
+        print(f"aceleración: x{lote / bucle:.2f}")
+
+    base = None
+    for procesos in args.procesos:
+        velocidad = medir_corpus(f"corpus {procesos} procesos",
+                                 lambda corpus: agent.procesar_corpus(corpus, procesos), corpus, args.repeticiones)
+        base = base or velocidad
+        print(f"{'':<22} escalado x{velocidad / base:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compila el léxico de sentimientos al archivo binario que carga el agente.
+
+Parte de los diccionarios del agente y añade o sustituye entradas leídas de
+archivos TSV de dominio, con una fila por palabra o frase:
+
+    frase <TAB> categoría <TAB> modificador <TAB> emoción
+
+donde la categoría es positivas, negativas, neutrales o -, el modificador un
+número o -, y la emoción una clave de EMOCIONES o - (las dos últimas columnas
+son opcionales). Las líneas vacías y las que empiezan por # se ignoran; una
+fila posterior sustituye a las anteriores de la misma frase.
+
+El archivo se reemplaza de forma atómica, así que un agente en marcha carga
+el léxico nuevo en su siguiente comprobación sin reiniciarse.
+
+Uso:
+    python compilar_lexico.py
+    python compilar_lexico.py dominio_hoteles.tsv dominio_envios.tsv --salida lexico_sentimientos.bin
+"""
+
+import argparse
+import csv
+import os
+import sys
+
+os.environ.setdefault("SENTIMIENTO_HISTORIAL_DB", "")  # compilar no toca el historial
+import agent
+
+
+def _opcional(valor: str):
+    valor = (valor or "").strip()
+    return None if valor in ("", "-") else valor
+
+
+def leer_tsv(ruta: str, lexico: dict) -> int:
+    """Añade al léxico las filas de un archivo TSV y devuelve cuántas leyó."""
+    filas = 0
+    with open(ruta, encoding="utf-8", newline="") as archivo:
+        for numero, fila in enumerate(csv.reader(archivo, delimiter="\t"), start=1):
+            if not fila or not fila[0].strip() or fila[0].lstrip().startswith("#"):
+                continue
+            fila += [""] * (4 - len(fila))
+            frase = agent.normalizar_frase(fila[0])
+            categoria, modificador, emocion = (_opcional(valor) for valor in fila[1:4])
+            if not frase:
+                raise ValueError(f"{ruta}:{numero}: frase vacía")
+            if categoria is not None and categoria not in agent.CATEGORIAS:
+                raise ValueError(f"{ruta}:{numero}: categoría desconocida {categoria!r}")
+            if emocion is not None and emocion not in agent.EMOCIONES:
+                raise ValueError(f"{ruta}:{numero}: emoción desconocida {emocion!r}")
+            try:
+                modificador = None if modificador is None else float(modificador)
+            except ValueError:
+                raise ValueError(f"{ruta}:{numero}: modificador no numérico {modificador!r}") from None
+            lexico[frase] = agent.crear_entrada(frase, categoria, modificador, emocion)
+            filas += 1
+    return filas
+
+
+def escribir_atomico(ruta: str, datos: bytes) -> None:
+    """Escribe en un temporal del mismo directorio y lo renombra sobre el destino."""
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "wb") as archivo:
+        archivo.write(datos)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compila el léxico de sentimientos")
+    parser.add_argument("tsv", nargs="*", help="Archivos TSV de dominio, en orden de precedencia")
+    parser.add_argument("--salida", default=agent.RUTA_LEXICO or "lexico_sentimientos.bin")
+    args = parser.parse_args()
+
+    lexico = agent.compilar_lexico()
+    for ruta in args.tsv:
+        try:
+            filas = leer_tsv(ruta, lexico)
+        except (OSError, ValueError) as error:
+            sys.exit(f"error: {error}")
+        print(f"{ruta}: {filas} entradas")
+
+    datos = agent.serializar_lexico(lexico)
+    escribir_atomico(args.salida, datos)
+    version = agent.LexicoCompilado(datos, args.salida).version
+    print(f"{args.salida}: {len(lexico)} entradas, {len(datos)} bytes, versión {version}")
+
+
+if __name__ == "__main__":
+    main()
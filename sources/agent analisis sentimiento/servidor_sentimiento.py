@@ -0,0 +1,146 @@
+"""
+Endpoint HTTP local del motor de sentimientos, sin LLM.
+
+Sirve el mismo análisis léxico que las herramientas del agente con
+peticiones y respuestas JSON, por lotes, para integraciones que no
+necesitan la conversación con el modelo:
+
+    POST /analizar   {"textos": ["...", "..."], "detalle": true}   (o {"texto": "..."})
+    GET  /tendencia?minutos=15&resolucion=minuto
+    GET  /palabras?periodo=hora&limite=10
+    GET  /salud
+
+Con --registrar los análisis se guardan en el historial (en la sesión
+indicada en el campo "sesion" de la petición, o "http"), y alimentan las
+tendencias y palabras frecuentes.
+
+Uso:
+    python servidor_sentimiento.py --port 8766
+    curl -s localhost:8766/analizar -d '{"textos": ["es excelente", "muy malo"]}'
+"""
+
+import argparse
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import agent
+
+MAX_CUERPO = 32 * 1024 * 1024  # bytes por petición
+MAX_TEXTOS = 10000  # textos por petición
+SESION_HTTP = "http"
+
+
+class SentimientoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive para clientes que envían muchos lotes
+    disable_nagle_algorithm = True
+    # Se sobrescribe por servidor en iniciar_servidor()
+    registrar = False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        consulta = {clave: valores[0] for clave, valores in parse_qs(url.query).items()}
+        try:
+            if url.path == "/salud":
+                self._responder({
+                    "status": "ok",
+                    "version_lexico": agent.fuente_lexico.actual().version,
+                    "cache": agent.obtener_estadisticas_cache(),
+                })
+            elif url.path == "/tendencia":
+                self._responder_herramienta(agent.obtener_tendencia_sentimiento(
+                    int(consulta.get("minutos", 15)), consulta.get("resolucion")
+                ))
+            elif url.path == "/palabras":
+                self._responder_herramienta(agent.obtener_palabras_frecuentes(
+                    consulta.get("periodo", "hora"), int(consulta.get("limite", 10))
+                ))
+            else:
+                self._responder({"error": f"Ruta desconocida: {url.path}"}, estado=404)
+        except ValueError:
+            self._responder({"error": "Parámetros numéricos no válidos."}, estado=400)
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/analizar":
+            self._responder({"error": f"Ruta desconocida: {self.path}"}, estado=404)
+            return
+        largo = self._largo_cuerpo()
+        if largo is None:
+            return
+        try:
+            peticion = json.loads(self.rfile.read(largo) or b"{}")
+        except ValueError:
+            self._responder({"error": "El cuerpo debe ser JSON."}, estado=400)
+            return
+
+        textos = [peticion["texto"]] if isinstance(peticion, dict) and "texto" in peticion else (
+            peticion.get("textos") if isinstance(peticion, dict) else None
+        )
+        if not isinstance(textos, list) or not all(isinstance(texto, str) for texto in textos):
+            self._responder({"error": 'Se espera {"textos": [...]} o {"texto": "..."} con cadenas.'}, estado=400)
+            return
+        if len(textos) > MAX_TEXTOS:
+            self._responder({"error": f"Como mucho {MAX_TEXTOS} textos por petición."}, estado=413)
+            return
+        sesion = str(peticion.get("sesion") or SESION_HTTP) if self.registrar else None
+        self._responder(agent.analizar_textos(textos, bool(peticion.get("detalle", True)), sesion))
+
+    def _largo_cuerpo(self):
+        """Content-Length validado, o None tras responder el error (el cuerpo queda sin leer)."""
+        cabecera = self.headers.get("Content-Length")
+        if self.headers.get("Transfer-Encoding"):
+            error, estado = "Se requiere Content-Length; no se admite Transfer-Encoding.", 411
+        elif cabecera is None:
+            error, estado = "Falta la cabecera Content-Length.", 411
+        elif not (cabecera.strip().isascii() and cabecera.strip().isdigit()):
+            error, estado = "Content-Length no válido.", 400
+        elif int(cabecera) > MAX_CUERPO:
+            error, estado = f"El cuerpo supera {MAX_CUERPO} bytes.", 413
+        else:
+            return int(cabecera)
+        self.close_connection = True
+        self._responder({"error": error}, estado=estado)
+        return None
+
+    def _responder_herramienta(self, respuesta: dict):
+        self._responder(respuesta, estado=400 if respuesta.get("status") == "error" else 200)
+
+    def _responder(self, cuerpo: dict, estado: int = 200):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SentimientoServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def iniciar_servidor(host: str = "127.0.0.1", port: int = 0, registrar: bool = False) -> SentimientoServer:
+    """Arranca el servidor en un hilo y lo devuelve; `server.server_address` tiene el puerto real."""
+    handler = type("SentimientoHandlerConfigurado", (SentimientoHandler,), {"registrar": registrar})
+    servidor = SentimientoServer((host, port), handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Endpoint HTTP del motor de sentimientos")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8766")))
+    parser.add_argument("--registrar", action="store_true", help="Guarda los análisis en el historial")
+    args = parser.parse_args()
+    servidor = iniciar_servidor(args.host, args.port, args.registrar)
+    print(f"Motor de sentimientos escuchando en http://{args.host}:{servidor.server_address[1]}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
@@ -0,0 +1,62 @@
+"""
+Pruebas de puntuar_documento frente a puntuar el texto completo.
+
+Uso (desde este directorio):
+    python -m unittest test_documento_largo
+"""
+
+import os
+import random
+import sys
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("SENTIMIENTO_HISTORIAL_DB", "")  # sin escrituras a disco durante las pruebas
+import agent
+
+
+def documento_sin_puntuacion(semilla: int, palabras: int) -> str:
+    azar = random.Random(semilla)
+    lexico = sorted(agent.PALABRAS_POSITIVAS | agent.PALABRAS_NEGATIVAS | agent.PALABRAS_NEUTRALES)
+    modificadores = sorted(agent.MODIFICADORES)
+    relleno = ["el", "producto", "servicio", "pero", "envío", "con", "para", "un", "poco"]
+    elegidas = []
+    for _ in range(palabras):
+        tirada = azar.random()
+        elegidas.append(azar.choice(modificadores if tirada < 0.3 else lexico if tirada < 0.6 else relleno))
+    return " ".join(elegidas)
+
+
+class PruebasDocumentoLargo(unittest.TestCase):
+
+    def comprobar_igual_que_texto_completo(self, texto: str, palabras_por_segmento: int):
+        segmentos = list(agent.puntuar_documento(texto, palabras_por_segmento))
+        completo = agent.puntuar_texto(texto)
+        total = completo.estadisticas["total"]
+        sentimiento, confianza = agent.determinar_sentimiento_y_confianza(completo.puntuacion, total)
+
+        ultimo = segmentos[-1]
+        self.assertEqual(ultimo.hasta_palabra, len(texto.split()))
+        self.assertEqual(ultimo.sentimiento_acumulado, sentimiento)
+        self.assertAlmostEqual(ultimo.confianza_acumulada, confianza, places=9)
+        self.assertAlmostEqual(ultimo.puntuacion_acumulada, completo.puntuacion / total, places=9)
+        self.assertEqual(sum(s.estadisticas["total"] for s in segmentos), total)
+        self.assertEqual(Counter(p for s in segmentos for p in s.palabras_clave), Counter(completo.palabras_clave))
+
+    def test_cortes_sin_puntuacion_no_parten_frases_ni_modificadores(self):
+        texto = documento_sin_puntuacion(semilla=7, palabras=20000)
+        for palabras_por_segmento in (1, 50, agent.SEGMENTO_PALABRAS):
+            with self.subTest(palabras_por_segmento=palabras_por_segmento):
+                self.comprobar_igual_que_texto_completo(texto, palabras_por_segmento)
+
+    def test_corte_dentro_de_una_frase(self):
+        # Sin puntuación se corta a las 400 palabras, justo entre "un" y "poco"
+        texto = " ".join(["producto"] * 399 + ["un", "poco", "bueno"] + ["producto"] * 50)
+        segmentos = list(agent.puntuar_documento(texto, agent.SEGMENTO_PALABRAS))
+        self.assertGreater(len(segmentos), 1)
+        self.comprobar_igual_que_texto_completo(texto, agent.SEGMENTO_PALABRAS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Pruebas de puntuar_lote frente al análisis texto a texto.
+
+Uso (desde este directorio):
+    python -m unittest test_puntuar_lote
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("SENTIMIENTO_HISTORIAL_DB", "")  # sin escrituras a disco durante las pruebas
+import agent
+
+
+class PruebasPuntuarLote(unittest.TestCase):
+
+    def test_lote_de_un_texto_sin_cortes(self):
+        # Sin signos de fin de cláusula el lote no tiene ningún corte
+        lote = agent.puntuar_lote(["es bueno"], con_detalle=True)
+        self.assertEqual(lote.sentimientos, ["positivo"])
+        self.assertEqual(lote.palabras_clave, [agent.puntuar_texto("es bueno").palabras_clave])
+
+        resultado = agent.analizar_texto_multiple(["es bueno"])
+        self.assertEqual(resultado["status"], "success")
+        self.assertEqual(resultado["resultados_individuales"][0]["sentimiento"], "positivo")
+
+    @unittest.skipIf(agent.np is None, "el lote solo se vectoriza con NumPy")
+    def test_lote_igual_que_texto_a_texto(self):
+        # Muchos modificadores seguidos: el producto de la ventana debe dar
+        # exactamente la misma puntuación, también junto a los umbrales ±0.1
+        azar = random.Random(3)
+        lexico = sorted(agent.PALABRAS_POSITIVAS | agent.PALABRAS_NEGATIVAS | agent.PALABRAS_NEUTRALES)
+        modificadores = sorted(agent.MODIFICADORES)
+        relleno = ["el", "producto", "servicio", "pero", "envío", "con", "para", ".", ",", "!"]
+        textos = []
+        for _ in range(3000):
+            palabras = []
+            for _ in range(azar.randint(1, 30)):
+                tirada = azar.random()
+                palabras.append(azar.choice(modificadores if tirada < 0.3 else lexico if tirada < 0.6 else relleno))
+            textos.append(" ".join(palabras))
+
+        lote = agent.puntuar_lote(textos, con_detalle=True)
+        for i, texto in enumerate(textos):
+            puntuado = agent.puntuar_texto(texto)
+            total = puntuado.estadisticas["total"]
+            if total:
+                sentimiento, confianza = agent.determinar_sentimiento_y_confianza(puntuado.puntuacion, total)
+                esperado = (sentimiento, confianza, puntuado.puntuacion / total)
+            else:
+                esperado = (None, 0.0, 0.0)
+            obtenido = (lote.sentimientos[i], lote.confianzas[i], lote.puntuaciones[i])
+            self.assertEqual(obtenido, esperado, texto)
+            self.assertEqual(lote.estadisticas[i], puntuado.estadisticas, texto)
+            self.assertEqual(lote.palabras_clave[i], puntuado.palabras_clave, texto)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,63 +1,1016 @@
-
+import asyncio
+import contextlib
 import datetime
-from zoneinfo import ZoneInfo
+import difflib
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from google.adk.agents import Agent
-import requests
+import httpx
 
-def get_weather(city: str) -> dict:
-    """Devuelve un reporte de clima usando la API pública wttr.in (sin clave)."""
-    response = requests.get(f"https://wttr.in/{city}?format=j1")
-    if not response.ok:
-        return {"status": "error", "error_message": "No pude obtener el clima."}
-    data = response.json()
-    c = data["current_condition"][0]
+# -------------------------
+# Normalización de nombres de ciudad
+# -------------------------
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+# Letras latinas que NFKD no separa en letra base + tilde ("Bø", "Łódź", "Ærø")
+_LATIN_LETTERS = str.maketrans({
+    "ø": "o", "ł": "l", "đ": "d", "ð": "d", "þ": "th", "æ": "ae", "œ": "oe", "ı": "i", "ħ": "h", "ŧ": "t",
+})
+
+
+def _strip_accents(name: str) -> str:
+    """Minúsculas sin tildes; las letras de otras escrituras se conservan tal cual."""
+    decomposed = unicodedata.normalize("NFKD", name)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold().translate(_LATIN_LETTERS)
+
+
+def _is_latin(name: str) -> bool:
+    """True si al quitar tildes todas las letras y cifras quedan en ASCII."""
+    return all(ch.isascii() for ch in _strip_accents(name) if ch.isalnum())
+
+
+def _fold_name(name: str) -> str:
+    """Quita tildes, mayúsculas y símbolos: "Bogotá" y " bogota. " dan "bogota".
+
+    Si el nombre lleva letras de otra escritura ("東京", "Москва") solo se pasa a
+    minúsculas y se normalizan los espacios, para que no quede vacío ni choque con otro.
+    """
+    if not _is_latin(name):
+        return " ".join(unicodedata.normalize("NFC", name).casefold().split())
+    return " ".join(_NON_ALNUM.sub(" ", _strip_accents(name)).split())
+
+
+# -------------------------
+# Caché de clima (TTL + stale-while-revalidate)
+# -------------------------
+
+# Segundos durante los que un reporte se considera fresco
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+# Segundos extra en los que se sirve el reporte vencido mientras se refresca en segundo plano
+WEATHER_CACHE_STALE_TTL = float(os.getenv("WEATHER_CACHE_STALE_TTL", "1800"))
+# Número máximo de ciudades en caché (se expulsa la menos usada)
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "512"))
+
+
+class WeatherCache:
+    """Caché LRU por ciudad con TTL y servicio de datos vencidos mientras se refrescan."""
+
+    def __init__(self, ttl: float, stale_ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # clave -> (valor, momento de almacenamiento)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "evictions": 0,
+        }
+        self._latency = {"hit": [0, 0.0], "miss": [0, 0.0]}  # tipo -> [llamadas, segundos]
+
+    def get(self, key: str):
+        """Devuelve (valor, es_fresco) o None si la ciudad no está en caché o ya expiró del todo."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            value, stored_at = entry
+            age = now - stored_at
+            if age > self.ttl + self.stale_ttl:
+                del self._entries[key]
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            if age <= self.ttl:
+                self._counters["hits"] += 1
+                return value, True
+            self._counters["stale_hits"] += 1
+            return value, False
+
+    def peek(self, key: str):
+        """Valor guardado aunque esté vencido, sin tocar contadores ni el orden LRU."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def age(self, key: str):
+        """Segundos desde que se guardó la entrada, o None si no está."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return time.monotonic() - entry[1] if entry is not None else None
+
+    def set(self, key: str, value) -> None:
+        """Guarda un valor y expulsa las entradas menos usadas si se supera el límite."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def start_refresh(self, key: str) -> bool:
+        """Marca una ciudad como en refresco; devuelve False si ya había uno en curso."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self._counters["refreshes"] += 1
+            return True
+
+    def end_refresh(self, key: str, ok: bool) -> None:
+        with self._lock:
+            self._refreshing.discard(key)
+            if not ok:
+                self._counters["refresh_errors"] += 1
+
+    def record_latency(self, kind: str, seconds: float) -> None:
+        with self._lock:
+            bucket = self._latency[kind]
+            bucket[0] += 1
+            bucket[1] += seconds
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Contadores de aciertos, fallos y refrescos junto con la latencia media por tipo."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+            stats["hit_rate"] = round((stats["hits"] + stats["stale_hits"]) / lookups, 4) if lookups else 0.0
+            hit_calls, hit_seconds = self._latency["hit"]
+            miss_calls, miss_seconds = self._latency["miss"]
+            stats["avg_hit_latency_us"] = round(hit_seconds / hit_calls * 1e6, 2) if hit_calls else None
+            stats["avg_miss_latency_ms"] = round(miss_seconds / miss_calls * 1e3, 2) if miss_calls else None
+        return stats
+
+
+weather_cache = WeatherCache(WEATHER_CACHE_TTL, WEATHER_CACHE_STALE_TTL, WEATHER_CACHE_MAX_ENTRIES)
+
+
+# -------------------------
+# Cliente HTTP asíncrono compartido
+# -------------------------
+
+WTTR_BASE_URL = os.getenv("WTTR_BASE_URL", "https://wttr.in").rstrip("/")
+# Timeouts explícitos para no dejar sesiones colgadas esperando a wttr.in
+WEATHER_CONNECT_TIMEOUT = float(os.getenv("WEATHER_CONNECT_TIMEOUT", "3"))
+WEATHER_READ_TIMEOUT = float(os.getenv("WEATHER_READ_TIMEOUT", "5"))
+# Máximo de peticiones simultáneas hacia wttr.in y conexiones keep-alive reutilizables
+WEATHER_MAX_CONCURRENCY = int(os.getenv("WEATHER_MAX_CONCURRENCY", "20"))
+WEATHER_MAX_KEEPALIVE = int(os.getenv("WEATHER_MAX_KEEPALIVE", "20"))
+
+
+class WeatherHttpClient:
+    """Cliente httpx compartido por todas las sesiones: pool keep-alive, timeouts y semáforo de concurrencia."""
+
+    def __init__(self, base_url: str, connect_timeout: float, read_timeout: float,
+                 max_concurrency: int, max_keepalive: int):
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout, read=read_timeout, write=read_timeout, pool=read_timeout
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_concurrency,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=30.0,
+        )
+        self.max_concurrency = max_concurrency
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+
+    def _ensure_client(self) -> None:
+        # El cliente y el semáforo quedan ligados al event loop donde se crean
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url, timeout=self.timeout, limits=self.limits
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+
+    async def get(self, path: str, params: dict = None, headers: dict = None) -> httpx.Response:
+        self._ensure_client()
+        async with self._semaphore:
+            return await self._client.get(path, params=params, headers=headers)
+
+    @contextlib.asynccontextmanager
+    async def stream(self, path: str, params: dict = None, headers: dict = None):
+        """Respuesta sin leer el cuerpo, para procesarlo por partes y cortar cuando sobra."""
+        self._ensure_client()
+        async with self._semaphore:
+            async with self._client.stream("GET", path, params=params, headers=headers) as response:
+                yield response
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+
+weather_http = WeatherHttpClient(
+    WTTR_BASE_URL,
+    WEATHER_CONNECT_TIMEOUT,
+    WEATHER_READ_TIMEOUT,
+    WEATHER_MAX_CONCURRENCY,
+    WEATHER_MAX_KEEPALIVE,
+)
+
+# Referencias a los refrescos en segundo plano para que no los recolecte el GC
+_background_tasks = set()
+
+
+class UnknownCityError(Exception):
+    """wttr.in respondió, pero no reconoce la ciudad."""
+
+
+class UpstreamUnavailableError(Exception):
+    """wttr.in falló, tardó demasiado o el circuito está abierto."""
+
+
+class UpstreamRejectedError(UpstreamUnavailableError):
+    """La petición no llegó a enviarse: circuito abierto o presupuesto agotado."""
+
+
+# -------------------------
+# Coalescencia de peticiones (single-flight)
+# -------------------------
+
+class SingleFlight:
+    """Comparte una única petición en curso entre todas las llamadas concurrentes con la misma clave.
+
+    Las peticiones que terminan con una excepción de `rejected` no llegaron a la red:
+    se cuentan aparte (junto con las llamadas que se les unieron) y no como ahorradas.
+    """
+
+    def __init__(self, rejected: tuple = ()):
+        self.rejected = rejected
+        self._inflight = {}  # clave -> asyncio.Task
+        self._waiters = {}  # asyncio.Task -> llamadas que se unieron a ella
+        self._counters = {"upstream_calls": 0, "coalesced": 0, "rejected": 0}
+
+    async def do(self, key: str, factory):
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self._waiters[task] += 1
+        else:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # shield: si una sesión se cancela, la petición sigue para las demás
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        waiters = self._waiters.pop(task, 0)
+        error = None if task.cancelled() else task.exception()  # evita avisos si nadie esperaba el error
+        if isinstance(error, self.rejected):
+            self._counters["rejected"] += 1 + waiters
+        else:
+            self._counters["upstream_calls"] += 1
+            self._counters["coalesced"] += waiters
+
+    def stats(self) -> dict:
+        stats = dict(self._counters)
+        stats["in_flight"] = len(self._inflight)
+        total = stats["upstream_calls"] + stats["coalesced"]
+        stats["saved_ratio"] = round(stats["coalesced"] / total, 4) if total else 0.0
+        return stats
+
+
+weather_flight = SingleFlight(rejected=(UpstreamRejectedError,))
+
+
+# -------------------------
+# Circuit breaker y caché negativa
+# -------------------------
+
+# Fallos seguidos de wttr.in que abren el circuito y segundos que permanece abierto
+WEATHER_BREAKER_THRESHOLD = int(os.getenv("WEATHER_BREAKER_THRESHOLD", "5"))
+WEATHER_BREAKER_RESET = float(os.getenv("WEATHER_BREAKER_RESET", "30"))
+# Segundos que se recuerda que una ciudad no existe en wttr.in
+WEATHER_NEGATIVE_TTL = float(os.getenv("WEATHER_NEGATIVE_TTL", "300"))
+
+
+class CircuitBreaker:
+    """Cerrado -> abierto tras N fallos seguidos -> semiabierto (una sola prueba) -> cerrado o abierto."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._counters = {"opened": 0, "rejected": 0, "failures": 0}
+
+    def allow(self) -> bool:
+        """Indica si se puede llamar a wttr.in; en semiabierto solo deja pasar una prueba."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self._counters["rejected"] += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    self._counters["rejected"] += 1
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._counters["failures"] += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self._counters["opened"] += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Libera la prueba semiabierta si la llamada se canceló sin resultado."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["state"] = self.state
+            stats["consecutive_failures"] = self._failures
+        return stats
+
+
+weather_breaker = CircuitBreaker(WEATHER_BREAKER_THRESHOLD, WEATHER_BREAKER_RESET)
+unknown_city_cache = WeatherCache(WEATHER_NEGATIVE_TTL, 0, WEATHER_CACHE_MAX_ENTRIES)
+
+
+# -------------------------
+# Presupuesto de peticiones y popularidad de ciudades
+# -------------------------
+
+# Tope duro de peticiones a wttr.in por minuto (usuarios + prefetch)
+WEATHER_UPSTREAM_BUDGET_PER_MIN = int(os.getenv("WEATHER_UPSTREAM_BUDGET_PER_MIN", "120"))
+# Fracción del presupuesto que el prefetch deja libre para las consultas de usuarios
+WEATHER_PREFETCH_RESERVE = float(os.getenv("WEATHER_PREFETCH_RESERVE", "0.25"))
+# Ciudades más pedidas que se mantienen calientes y cada cuánto se revisan
+WEATHER_PREFETCH_TOP_N = int(os.getenv("WEATHER_PREFETCH_TOP_N", "20"))
+WEATHER_PREFETCH_INTERVAL = float(os.getenv("WEATHER_PREFETCH_INTERVAL", "60"))
+# Se refresca una entrada si le quedan menos de estos segundos de frescura
+WEATHER_PREFETCH_MARGIN = float(os.getenv("WEATHER_PREFETCH_MARGIN", "120"))
+# Vida media (s) del contador de popularidad: una consulta vieja pesa la mitad tras este tiempo
+WEATHER_POPULARITY_HALF_LIFE = float(os.getenv("WEATHER_POPULARITY_HALF_LIFE", "1800"))
+
+
+class UpstreamBudget:
+    """Ventana deslizante de 60 s con el número de peticiones hechas a wttr.in."""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._calls = deque()
+        self._lock = threading.Lock()
+        self._rejected = 0
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0] >= 60.0:
+            self._calls.popleft()
+
+    def try_acquire(self, reserve: int = 0) -> bool:
+        """Consume una petición si quedan más de `reserve` disponibles en el último minuto."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if len(self._calls) + reserve >= self.per_minute:
+                self._rejected += 1
+                return False
+            self._calls.append(now)
+            return True
+
+    def remaining(self) -> int:
+        with self._lock:
+            self._trim(time.monotonic())
+            return self.per_minute - len(self._calls)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._trim(time.monotonic())
+            return {"per_minute": self.per_minute, "used_last_minute": len(self._calls), "rejected": self._rejected}
+
+
+class PopularityTracker:
+    """Frecuencia de consultas por ciudad con decaimiento exponencial."""
+
+    def __init__(self, half_life: float, max_entries: int = 2048):
+        self._decay = math.log(2) / half_life
+        self.max_entries = max_entries
+        self._scores = {}  # clave -> [puntaje, momento, nombre tal como lo pidió el usuario]
+        self._lock = threading.Lock()
+
+    def _score(self, entry, now: float) -> float:
+        return entry[0] * math.exp(-self._decay * (now - entry[1]))
+
+    def hit(self, key: str, city: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._scores.get(key)
+            if entry is None:
+                self._scores[key] = [1.0, now, city]
+                if len(self._scores) > self.max_entries:
+                    self._prune(now)
+            else:
+                entry[0] = self._score(entry, now) + 1.0
+                entry[1] = now
+
+    def _prune(self, now: float) -> None:
+        # Se queda con la mitad más popular
+        ranked = sorted(self._scores.items(), key=lambda item: self._score(item[1], now), reverse=True)
+        self._scores = dict(ranked[:self.max_entries // 2])
+
+    def top(self, n: int) -> list:
+        """Las n ciudades más populares ahora mismo como (clave, ciudad, puntaje)."""
+        now = time.monotonic()
+        with self._lock:
+            scored = [(key, entry[2], self._score(entry, now)) for key, entry in self._scores.items()]
+        scored.sort(key=lambda item: item[2], reverse=True)
+        return scored[:n]
+
+
+weather_budget = UpstreamBudget(WEATHER_UPSTREAM_BUDGET_PER_MIN)
+weather_popularity = PopularityTracker(WEATHER_POPULARITY_HALF_LIFE)
+
+
+# -------------------------
+# Descarga ligera de condiciones actuales
+# -------------------------
+
+# "lean": formato de una línea con solo los cuatro campos; "j1": JSON completo leído por partes
+WEATHER_FETCH_MODE = os.getenv("WEATHER_FETCH_MODE", "lean")
+# Descripción | temperatura | humedad | sensación térmica (unidades métricas con `m`)
+LEAN_FORMAT = "%C|%t|%h|%f"
+_NUMBER = re.compile(r"[+-]?\d+")
+_CURRENT_CONDITION_KEY = '"current_condition"'
+
+
+def _request_headers(previous) -> dict:
+    headers = {"Accept-Encoding": "gzip, deflate"}
+    if previous is not None:
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+    return headers
+
+
+def _check_status(response: httpx.Response) -> None:
+    if response.status_code == 404:
+        raise UnknownCityError(str(response.url))
+    if not response.is_success:
+        raise UpstreamUnavailableError(f"HTTP {response.status_code}")
+
+
+def _with_validators(conditions: dict, response: httpx.Response) -> dict:
+    conditions["etag"] = response.headers.get("ETag")
+    conditions["last_modified"] = response.headers.get("Last-Modified")
+    return conditions
+
+
+def _parse_lean(body: str) -> dict:
+    """Interpreta "Partly cloudy|+15°C|72%|+14°C"."""
+    if body.startswith("Unknown location"):
+        raise UnknownCityError(body)
+    description, temp, humidity, feels_like = (part.strip() for part in body.strip().split("|"))
+    return {
+        "description": description.lower(),
+        "temp_c": str(int(_NUMBER.search(temp).group())),
+        "humidity": _NUMBER.search(humidity).group(),
+        "feels_like_c": str(int(_NUMBER.search(feels_like).group())),
+    }
+
+
+async def _read_current_condition(response: httpx.Response) -> dict:
+    """Lee el JSON j1 por trozos y se detiene en cuanto `current_condition` está completo."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    async for chunk in response.aiter_text():
+        buffer += chunk
+        start = buffer.find(_CURRENT_CONDITION_KEY)
+        bracket = buffer.find("[", start) if start >= 0 else -1
+        if bracket < 0:
+            continue
+        try:
+            items, _ = decoder.raw_decode(buffer, bracket)
+        except json.JSONDecodeError:
+            continue  # lista aún incompleta
+        return items[0]
+    raise ValueError("respuesta sin current_condition")
+
+
+async def _fetch_conditions(city: str, previous: dict = None) -> dict:
+    """Consulta wttr.in y devuelve las condiciones actuales.
+
+    Con `previous` se envían ETag/Last-Modified y un 304 reutiliza esas condiciones.
+    """
+    headers = _request_headers(previous)
+    try:
+        if WEATHER_FETCH_MODE == "j1":
+            async with weather_http.stream(f"/{city}", params={"format": "j1"}, headers=headers) as response:
+                if response.status_code == 304 and previous is not None:
+                    return previous
+                _check_status(response)
+                c = await _read_current_condition(response)
+            return _with_validators({
+                "description": c["weatherDesc"][0]["value"].lower(),
+                "temp_c": c["temp_C"],
+                "humidity": c["humidity"],
+                "feels_like_c": c["FeelsLikeC"],
+            }, response)
+
+        response = await weather_http.get(f"/{city}", params={"format": LEAN_FORMAT, "m": ""}, headers=headers)
+        if response.status_code == 304 and previous is not None:
+            return previous
+        _check_status(response)
+        return _with_validators(_parse_lean(response.text), response)
+    except (httpx.HTTPError, ValueError, KeyError, IndexError, AttributeError) as e:
+        raise UpstreamUnavailableError(str(e)) from e
+
+
+async def _fetch_guarded(city: str, key: str, reserve: int = 0) -> dict:
+    """_fetch_conditions detrás del circuit breaker y del presupuesto por minuto:
+    si el circuito está abierto o no queda presupuesto falla al instante."""
+    if not weather_breaker.allow():
+        raise UpstreamRejectedError("circuito abierto")
+    if not weather_budget.try_acquire(reserve):
+        weather_breaker.release()
+        raise UpstreamRejectedError("presupuesto de peticiones agotado")
+    settled = False
+    try:
+        conditions = await _fetch_conditions(city, weather_cache.peek(key))
+    except UnknownCityError:
+        weather_breaker.record_success()  # el servicio respondió bien
+        settled = True
+        raise
+    except UpstreamUnavailableError:
+        weather_breaker.record_failure()
+        settled = True
+        raise
+    else:
+        weather_breaker.record_success()
+        settled = True
+        return conditions
+    finally:
+        if not settled:
+            weather_breaker.release()
+
+
+def _format_report(city: str, conditions: dict) -> dict:
     report = (
-        f"El clima en {city} es {c['weatherDesc'][0]['value'].lower()} "
-        f"con temperatura {c['temp_C']}°C, humedad {c['humidity']}% "
-        f"y sensación térmica {c['FeelsLikeC']}°C."
+        f"El clima en {city} es {conditions['description']} "
+        f"con temperatura {conditions['temp_c']}°C, humedad {conditions['humidity']}% "
+        f"y sensación térmica {conditions['feels_like_c']}°C."
     )
     return {"status": "success", "report": report}
 
 
-def get_current_time(city: str) -> dict:
-    """Devuelve hora local para múltiples ciudades usando sus zonas horarias."""
-    # Diccionario ampliado de ciudades y sus zonas horarias
-    tz_map = {
-        "bogota": "America/Bogota",
-        "nueva york": "America/New_York",
-        "londres": "Europe/London",
-        "paris": "Europe/Paris",
-        "madrid": "Europe/Madrid",
-        "tokio": "Asia/Tokyo",
-        "sydney": "Australia/Sydney",
-        "ciudad de mexico": "America/Mexico_City",
-        "buenos aires": "America/Argentina/Buenos_Aires",
-        "hong kong": "Asia/Hong_Kong",
-        "dubai": "Asia/Dubai",
-        "moscú": "Europe/Moscow",
-        "singapur": "Asia/Singapore",
-        "rio de janeiro": "America/Sao_Paulo",
-        "chicago": "America/Chicago",
-        "los angeles": "America/Los_Angeles",
-        "toronto": "America/Toronto",
-        "berlin": "Europe/Berlin",
-        "amsterdam": "Europe/Amsterdam",
-        "roma": "Europe/Rome"
+async def _refresh_in_background(city: str, key: str) -> None:
+    ok = False
+    try:
+        conditions = await weather_flight.do(key, lambda: _fetch_guarded(city, key))
+        weather_cache.set(key, conditions)
+        ok = True
+    except (UnknownCityError, UpstreamUnavailableError):
+        pass  # se sigue sirviendo el dato vencido
+    finally:
+        weather_cache.end_refresh(key, ok)
+
+
+async def get_weather(city: str) -> dict:
+    """Devuelve un reporte de clima usando la API pública wttr.in (sin clave)."""
+    started = time.perf_counter()
+    key = _fold_name(city)
+    weather_popularity.hit(key, city)
+    _ensure_prefetcher()
+    cached = weather_cache.get(key)
+    if cached is not None:
+        conditions, fresh = cached
+        if not fresh and weather_cache.start_refresh(key):
+            task = asyncio.create_task(_refresh_in_background(city, key))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        result = _format_report(city, conditions)
+        weather_cache.record_latency("hit", time.perf_counter() - started)
+        return result
+
+    if unknown_city_cache.get(key) is not None:
+        return {"status": "error", "error_message": f"No encontré la ciudad {city} en el servicio de clima."}
+    try:
+        conditions = await weather_flight.do(key, lambda: _fetch_guarded(city, key))
+    except UnknownCityError:
+        unknown_city_cache.set(key, True)
+        return {"status": "error", "error_message": f"No encontré la ciudad {city} en el servicio de clima."}
+    except UpstreamUnavailableError:
+        return {"status": "error", "error_message": "No pude obtener el clima."}
+    weather_cache.set(key, conditions)
+    weather_cache.record_latency("miss", time.perf_counter() - started)
+    return _format_report(city, conditions)
+
+
+# -------------------------
+# Prefetch de ciudades populares
+# -------------------------
+
+_prefetch = {"task": None, "runs": 0, "refreshed": 0}
+
+
+def _ensure_prefetcher() -> None:
+    """Arranca el bucle de prefetch en el event loop actual si aún no corre."""
+    if WEATHER_PREFETCH_TOP_N <= 0:
+        return
+    task = _prefetch["task"]
+    if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+        _prefetch["task"] = asyncio.create_task(_prefetch_loop())
+
+
+async def _prefetch_loop() -> None:
+    while True:
+        await asyncio.sleep(WEATHER_PREFETCH_INTERVAL)
+        await prefetch_hot_cities()
+
+
+async def prefetch_hot_cities() -> int:
+    """Refresca las ciudades más populares cuya entrada está por vencer; devuelve cuántas refrescó."""
+    reserve = int(weather_budget.per_minute * WEATHER_PREFETCH_RESERVE)
+    refreshed = 0
+    _prefetch["runs"] += 1
+    for key, city, _ in weather_popularity.top(WEATHER_PREFETCH_TOP_N):
+        age = weather_cache.age(key)
+        if age is not None and age < weather_cache.ttl - WEATHER_PREFETCH_MARGIN:
+            continue  # aún le queda frescura
+        if unknown_city_cache.peek(key) is not None:
+            continue
+        if weather_budget.remaining() <= reserve or weather_breaker.state == CircuitBreaker.OPEN:
+            break
+        try:
+            conditions = await weather_flight.do(
+                key, lambda city=city, key=key: _fetch_guarded(city, key, reserve)
+            )
+        except (UnknownCityError, UpstreamUnavailableError):
+            continue
+        weather_cache.set(key, conditions)
+        refreshed += 1
+    _prefetch["refreshed"] += refreshed
+    return refreshed
+
+
+def get_weather_cache_stats() -> dict:
+    """Métricas de la caché de clima (aciertos, fallos, refrescos y latencias medias),
+    de las peticiones a wttr.in ahorradas por coalescencia, del circuit breaker,
+    del presupuesto por minuto y del prefetch."""
+    stats = weather_cache.stats()
+    stats["single_flight"] = weather_flight.stats()
+    stats["circuit_breaker"] = weather_breaker.stats()
+    stats["unknown_cities"] = unknown_city_cache.stats()["entries"]
+    stats["upstream_budget"] = weather_budget.stats()
+    stats["prefetch"] = {
+        "runs": _prefetch["runs"],
+        "refreshed": _prefetch["refreshed"],
+        "hot_cities": [city for _, city, _ in weather_popularity.top(WEATHER_PREFETCH_TOP_N)],
     }
-    # Normalizar la entrada
-    city_lower = city.lower()
+    return stats
+
+
+# -------------------------
+# Índice de zonas horarias
+# -------------------------
+
+# Zona IANA -> nombres con los que los usuarios preguntan (español e inglés)
+TZ_ALIASES = {
+    "America/Bogota": ["bogota", "santa fe de bogota"],
+    "America/New_York": ["nueva york", "new york", "new york city", "nyc"],
+    "Europe/London": ["londres", "london"],
+    "Europe/Paris": ["paris"],
+    "Europe/Madrid": ["madrid"],
+    "Asia/Tokyo": ["tokio", "tokyo"],
+    "Australia/Sydney": ["sydney", "sidney"],
+    "America/Mexico_City": ["ciudad de mexico", "mexico city", "cdmx", "mexico df"],
+    "America/Argentina/Buenos_Aires": ["buenos aires"],
+    "Asia/Hong_Kong": ["hong kong", "hongkong"],
+    "Asia/Dubai": ["dubai"],
+    "Europe/Moscow": ["moscu", "moscow"],
+    "Asia/Singapore": ["singapur", "singapore"],
+    "America/Sao_Paulo": ["rio de janeiro", "sao paulo", "san pablo"],
+    "America/Chicago": ["chicago"],
+    "America/Los_Angeles": ["los angeles", "san francisco"],
+    "America/Toronto": ["toronto"],
+    "Europe/Berlin": ["berlin"],
+    "Europe/Amsterdam": ["amsterdam"],
+    "Europe/Rome": ["roma", "rome"],
+    "America/Lima": ["lima"],
+    "America/Santiago": ["santiago de chile", "santiago"],
+    "America/Caracas": ["caracas"],
+    "America/Guayaquil": ["quito", "guayaquil"],
+    "America/Panama": ["ciudad de panama", "panama city", "panama"],
+}
+
+
+def _build_tz_index() -> dict:
+    """Nombre normalizado -> ZoneInfo ya construido; se arma una sola vez al importar."""
+    index = {}
+    for zone_name, aliases in TZ_ALIASES.items():
+        try:
+            zone = ZoneInfo(zone_name)
+        except ZoneInfoNotFoundError:
+            continue  # sistema sin esa zona en su base tzdata
+        for alias in aliases:
+            index[_fold_name(alias)] = zone
+    return index
+
+
+TZ_INDEX = _build_tz_index()
+_TZ_KEYS = tuple(TZ_INDEX)
+
 
-    if city_lower not in tz_map:
+@lru_cache(maxsize=None)
+def _zone_by_name(zone_name: str):
+    try:
+        return ZoneInfo(zone_name)
+    except ZoneInfoNotFoundError:
+        return None
+
+
+@lru_cache(maxsize=1024)
+def _closest_tz_key(key: str):
+    """Coincidencia aproximada para errores de escritura ("bogta", "londrs")."""
+    matches = difflib.get_close_matches(key, _TZ_KEYS, n=1, cutoff=0.8)
+    return matches[0] if matches else None
+
+
+# -------------------------
+# Gazetteer offline (ciudades -> zona horaria, mapeado en memoria)
+# -------------------------
+
+GAZETTEER_PATH = os.getenv(
+    "GAZETTEER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ciudades_tz.bin")
+)
+
+# Formato del archivo (little-endian), generado por construir_gazetteer.py:
+#   cabecera: magic, nº registros, nº zonas y desplazamientos de cada sección
+#   zonas:    nombres IANA (u8 longitud + utf-8)
+#   registros: ordenados por clave normalizada y luego población descendente
+#   claves y nombres: blobs utf-8 referenciados por desplazamiento
+GAZETTEER_MAGIC = b"GAZTZ01\0"
+GAZETTEER_HEADER = struct.Struct("<8sIIIIII")  # magic, registros, zonas, off_zonas, off_registros, off_claves, off_nombres
+GAZETTEER_RECORD = struct.Struct("<IIIHBB2s")  # off_clave, off_nombre, población, zona, len_clave, len_nombre, país
+
+
+class CityGazetteer:
+    """Índice binario de ciudades mapeado en memoria: búsqueda exacta y por prefijo sin red."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self._count, zone_count, zones_off, self._records_off,
+         self._keys_off, self._names_off) = GAZETTEER_HEADER.unpack_from(self._mm, 0)
+        if magic != GAZETTEER_MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} no es un gazetteer válido")
+        zones = []
+        pos = zones_off
+        for _ in range(zone_count):
+            size = self._mm[pos]
+            zones.append(self._mm[pos + 1:pos + 1 + size].decode("utf-8"))
+            pos += 1 + size
+        self.zones = tuple(zones)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _record(self, i: int):
+        return GAZETTEER_RECORD.unpack_from(self._mm, self._records_off + i * GAZETTEER_RECORD.size)
+
+    def _key(self, i: int) -> bytes:
+        key_off, _, _, _, key_len, _, _ = self._record(i)
+        start = self._keys_off + key_off
+        return self._mm[start:start + key_len]
+
+    def _entry(self, i: int) -> dict:
+        _, name_off, population, zone_id, _, name_len, country = self._record(i)
+        start = self._names_off + name_off
+        return {
+            "name": self._mm[start:start + name_len].decode("utf-8"),
+            "country": country.decode("ascii"),
+            "timezone": self.zones[zone_id],
+            "population": population,
+        }
+
+    def _lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lookup(self, folded_name: str):
+        """Ciudad más poblada con ese nombre normalizado, o None."""
+        key = folded_name.encode("utf-8")
+        i = self._lower_bound(key)
+        if i < self._count and self._key(i) == key:
+            return self._entry(i)
+        return None
+
+    def search_prefix(self, folded_prefix: str, limit: int = 10, max_scan: int = 50000) -> list:
+        """Ciudades cuyo nombre normalizado empieza por el prefijo, de mayor a menor población.
+
+        Primero las que empiezan así por su nombre y después las que solo
+        coinciden por un nombre alternativo (Saigón, Madrás...).
+        """
+        prefix = folded_prefix.encode("utf-8")
+        start = self._lower_bound(prefix)
+        end = min(self._lower_bound(prefix + b"\xff"), start + max_scan)
+        # Se ordena por la población del registro y solo se decodifican los nombres necesarios
+        by_population = sorted(range(start, end), key=lambda i: -self._record(i)[2])
+        seen = set()
+        primary, aliases = [], []
+        for i in by_population:
+            entry = self._entry(i)
+            ident = (entry["name"], entry["country"], entry["timezone"])
+            if ident in seen:
+                continue
+            seen.add(ident)
+            if _fold_name(entry["name"]).startswith(folded_prefix):
+                primary.append(entry)
+                if len(primary) == limit:
+                    break
+            elif len(aliases) < limit:
+                aliases.append(entry)
+        return (primary + aliases)[:limit]
+
+
+def _open_gazetteer(path: str):
+    try:
+        return CityGazetteer(path)
+    except (OSError, ValueError):
+        return None  # sin archivo se usa solo el índice de alias
+
+
+city_gazetteer = _open_gazetteer(GAZETTEER_PATH)
+
+
+def _resolve_timezone(city: str):
+    key = _fold_name(city)
+    zone = TZ_INDEX.get(key)
+    if zone is None and key and city_gazetteer is not None:
+        entry = city_gazetteer.lookup(key)
+        if entry is not None:
+            zone = _zone_by_name(entry["timezone"])
+    if zone is None and key:
+        closest = _closest_tz_key(key)
+        if closest is not None:
+            zone = TZ_INDEX[closest]
+    return zone
+
+
+def get_current_time(city: str) -> dict:
+    """Devuelve hora local para múltiples ciudades usando sus zonas horarias."""
+    zone = _resolve_timezone(city)
+    if zone is None:
         return {"status": "error", "error_message": f"No tengo zona horaria para {city}."}
 
     try:
-        now = datetime.datetime.now(ZoneInfo(tz_map[city_lower]))
+        now = datetime.datetime.now(zone)
         report = now.strftime("%H:%M:%S del %d-%m-%Y")
         return {"status": "success", "report": f"La hora en {city} es {report}."}
     except Exception as e:
         return {"status": "error", "error_message": f"Error al obtener la hora: {str(e)}"}
 
 
+def search_cities(prefix: str, limit: int = 10) -> dict:
+    """Busca ciudades por nombre o inicio del nombre y devuelve su país y zona horaria."""
+    key = _fold_name(prefix)
+    if len(key) < 2:
+        return {"status": "error", "error_message": "Escribe al menos dos letras del nombre."}
+    if city_gazetteer is None:
+        return {"status": "error", "error_message": "El listado de ciudades no está disponible."}
+    matches = city_gazetteer.search_prefix(key, limit=max(1, min(limit, 50)))
+    if not matches:
+        return {"status": "error", "error_message": f"No encontré ciudades que empiecen por {prefix}."}
+    return {"status": "success", "cities": matches}
+
+
+# -------------------------
+# Herramientas por lotes (varias ciudades en una sola llamada)
+# -------------------------
+
+# Consultas de clima en paralelo dentro de un mismo lote
+WEATHER_BATCH_CONCURRENCY = int(os.getenv("WEATHER_BATCH_CONCURRENCY", "8"))
+MAX_CITIES_PER_BATCH = int(os.getenv("MAX_CITIES_PER_BATCH", "25"))
+
+
+def _unique_cities(cities: list[str]) -> list[str]:
+    """Quita vacíos y repetidos (misma ciudad normalizada) conservando el orden."""
+    seen = set()
+    unique = []
+    for city in cities:
+        key = _fold_name(city)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(city.strip())
+    return unique
+
+
+def _combine_results(results: list[tuple[str, dict]]) -> dict:
+    """Une los resultados por ciudad en una sola respuesta para el modelo."""
+    combined = []
+    failures = 0
+    for city, result in results:
+        entry = {"city": city, "status": result["status"]}
+        if result["status"] == "success":
+            entry["report"] = result["report"]
+        else:
+            entry["error_message"] = result["error_message"]
+            failures += 1
+        combined.append(entry)
+    if failures == 0:
+        status = "success"
+    elif failures < len(combined):
+        status = "partial"
+    else:
+        status = "error"
+    return {"status": status, "results": combined}
+
+
+def _check_batch(cities: list[str]):
+    if isinstance(cities, str):
+        cities = [cities]  # una sola ciudad, no una lista de letras
+    unique = _unique_cities(cities or [])
+    if not unique:
+        return None, {"status": "error", "error_message": "Debes indicar al menos una ciudad."}
+    if len(unique) > MAX_CITIES_PER_BATCH:
+        return None, {
+            "status": "error",
+            "error_message": f"Máximo {MAX_CITIES_PER_BATCH} ciudades por consulta.",
+        }
+    return unique, None
+
+
+async def get_weather_many(cities: list[str]) -> dict:
+    """Devuelve el clima de varias ciudades a la vez, consultándolas en paralelo."""
+    unique, error = _check_batch(cities)
+    if error:
+        return error
+    semaphore = asyncio.Semaphore(WEATHER_BATCH_CONCURRENCY)
+
+    async def fetch(city: str):
+        async with semaphore:
+            return city, await get_weather(city)
+
+    return _combine_results(await asyncio.gather(*(fetch(city) for city in unique)))
+
+
+def get_current_time_many(cities: list[str]) -> dict:
+    """Devuelve la hora local de varias ciudades en una sola respuesta."""
+    unique, error = _check_batch(cities)
+    if error:
+        return error
+    return _combine_results([(city, get_current_time(city)) for city in unique])
+
+
 root_agent = Agent(
     name="weather_time_agent",
     model="gemini-2.5-flash",
@@ -66,8 +1019,10 @@ root_agent = Agent(
     ),
     instruction=(
         "Eres un asistente que puede responder preguntas del clima y la hora de acuerdo a la ciudad, usa las herramientas disponibles para ello"
-        "Envia la ciudad en minuscula y sin acentos o simbolos, responde siempre en español"
+        "Envia la ciudad en minuscula y sin acentos o simbolos, responde siempre en español. "
+        "Si preguntan por varias ciudades usa get_weather_many y get_current_time_many con todas en una sola llamada. "
+        "Si una ciudad es ambigua o no la encuentras usa search_cities para ver las opciones"
 
     ),
-    tools=[get_weather, get_current_time],
+    tools=[get_weather, get_current_time, get_weather_many, get_current_time_many, search_cities],
 )
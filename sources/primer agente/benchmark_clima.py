@@ -0,0 +1,202 @@
+"""
+Benchmark de latencia de las herramientas de clima y hora, sin red.
+
+Levanta wttr_local.py en un proceso aparte (con las grabaciones j1), llama a las
+herramientas directamente y a través de la interfaz de herramientas ADK del
+`weather_time_agent`, y reporta p50/p95/p99 y llamadas/s para cada nivel de
+concurrencia. Con --max-p95/--min-rps sale con código 1 si hay regresiones,
+para usarlo en CI.
+
+Uso:
+    python benchmark_clima.py --concurrencia 1,10,50,100 --llamadas 500 --latencia 0.03
+    python benchmark_clima.py --json resultados.json --max-p95 get_weather_caliente=5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+CIUDADES_CALIENTES = ["bogota", "madrid", "tokio", "lima", "paris", "londres", "roma", "berlin"]
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def iniciar_wttr_local(args) -> tuple:
+    """Arranca el servidor en otro proceso para no competir por el GIL con el cliente."""
+    puerto = _puerto_libre()
+    proceso = subprocess.Popen(
+        [sys.executable, os.path.join(DIRECTORIO, "wttr_local.py"), "--port", str(puerto),
+         "--latencia", str(args.latencia), "--jitter", str(args.jitter),
+         "--tasa-errores", str(args.tasa_errores)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    proceso.stdout.readline()  # espera al mensaje de arranque
+    return proceso, f"http://127.0.0.1:{puerto}"
+
+
+def percentil(ordenados: list, p: float) -> float:
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+async def medir(llamada, concurrencia: int, total: int) -> dict:
+    """Ejecuta `total` llamadas con `concurrencia` trabajadores y resume las latencias."""
+    latencias = []
+    errores = 0
+    siguiente = iter(range(total))
+
+    async def trabajador():
+        nonlocal errores
+        for i in siguiente:
+            inicio = time.perf_counter()
+            resultado = await llamada(i)
+            latencias.append(time.perf_counter() - inicio)
+            if resultado.get("status") != "success":
+                errores += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        "concurrencia": concurrencia,
+        "llamadas": total,
+        "errores": errores,
+        "llamadas_por_s": round(total / duracion, 1),
+        "p50_ms": round(percentil(latencias, 0.50) * 1000, 3),
+        "p95_ms": round(percentil(latencias, 0.95) * 1000, 3),
+        "p99_ms": round(percentil(latencias, 0.99) * 1000, 3),
+    }
+
+
+async def _herramientas_adk(agent):
+    """Herramientas del agente tal como las invoca ADK, con un ToolContext real."""
+    from google.adk.agents.invocation_context import InvocationContext
+    from google.adk.sessions import InMemorySessionService
+    from google.adk.tools.tool_context import ToolContext
+
+    servicio = InMemorySessionService()
+    sesion = await servicio.create_session(app_name="benchmark_clima", user_id="benchmark")
+    contexto = InvocationContext(
+        session_service=servicio, invocation_id="benchmark", agent=agent.root_agent, session=sesion
+    )
+    herramientas = {h.name: h for h in await agent.root_agent.canonical_tools()}
+    return herramientas, ToolContext(contexto)
+
+
+async def ejecutar(agent, args) -> list:
+    herramientas, contexto = await _herramientas_adk(agent)
+    cache = agent.weather_cache
+    ttl, stale_ttl = cache.ttl, cache.stale_ttl
+
+    def sin_cache():
+        cache.ttl = cache.stale_ttl = 0
+        cache.clear()
+
+    async def con_cache():
+        cache.ttl, cache.stale_ttl = ttl, stale_ttl
+        for ciudad in CIUDADES_CALIENTES:
+            await agent.get_weather(ciudad)
+
+    async def hora(i):
+        return agent.get_current_time(CIUDADES_CALIENTES[i % len(CIUDADES_CALIENTES)])
+
+    escenarios = [
+        # nombre, preparación, llamada
+        ("get_weather_frio", sin_cache, lambda i: agent.get_weather(f"ciudad {i}")),
+        ("get_weather_many_frio", sin_cache,
+         lambda i: agent.get_weather_many([f"lote {i} ciudad {n}" for n in range(5)])),
+        ("get_weather_caliente", con_cache,
+         lambda i: agent.get_weather(CIUDADES_CALIENTES[i % len(CIUDADES_CALIENTES)])),
+        ("get_current_time", None, hora),
+        ("adk:get_weather_caliente", con_cache,
+         lambda i: herramientas["get_weather"].run_async(
+             args={"city": CIUDADES_CALIENTES[i % len(CIUDADES_CALIENTES)]}, tool_context=contexto)),
+        ("adk:get_current_time", None,
+         lambda i: herramientas["get_current_time"].run_async(
+             args={"city": CIUDADES_CALIENTES[i % len(CIUDADES_CALIENTES)]}, tool_context=contexto)),
+    ]
+    resultados = []
+    for nombre, preparar, llamada in escenarios:
+        if args.escenarios and nombre not in args.escenarios:
+            continue
+        for concurrencia in args.concurrencia:
+            if preparar is not None:
+                retorno = preparar()
+                if asyncio.iscoroutine(retorno):
+                    await retorno
+            fila = {"escenario": nombre, **await medir(llamada, concurrencia, args.llamadas)}
+            resultados.append(fila)
+            print(
+                f"{nombre:<26} c={concurrencia:<4} {fila['llamadas_por_s']:>10.1f} llamadas/s | "
+                f"p50 {fila['p50_ms']:>9.3f} ms | p95 {fila['p95_ms']:>9.3f} ms | "
+                f"p99 {fila['p99_ms']:>9.3f} ms | errores {fila['errores']}",
+                flush=True,
+            )
+    await agent.weather_http.aclose()
+    return resultados
+
+
+def _umbrales(pares: list) -> dict:
+    return {nombre: float(valor) for nombre, valor in (par.split("=", 1) for par in pares or [])}
+
+
+def revisar_regresiones(resultados: list, max_p95: dict, min_rps: dict) -> list:
+    fallos = []
+    for fila in resultados:
+        limite = max_p95.get(fila["escenario"])
+        if limite is not None and fila["p95_ms"] > limite:
+            fallos.append(f"{fila['escenario']} c={fila['concurrencia']}: p95 {fila['p95_ms']} ms > {limite} ms")
+        minimo = min_rps.get(fila["escenario"])
+        if minimo is not None and fila["llamadas_por_s"] < minimo:
+            fallos.append(f"{fila['escenario']} c={fila['concurrencia']}: {fila['llamadas_por_s']} llamadas/s < {minimo}")
+    return fallos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las herramientas de clima y hora")
+    parser.add_argument("--concurrencia", type=lambda v: [int(n) for n in v.split(",")], default=[1, 10, 50, 100])
+    parser.add_argument("--llamadas", type=int, default=500, help="Llamadas por escenario y nivel")
+    parser.add_argument("--latencia", type=float, default=0.03, help="Latencia simulada de wttr.in (s)")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--tasa-errores", type=float, default=0.0)
+    parser.add_argument("--escenarios", nargs="*", help="Ejecuta solo estos escenarios")
+    parser.add_argument("--json", help="Guarda los resultados en este archivo")
+    parser.add_argument("--max-p95", nargs="*", metavar="ESCENARIO=MS")
+    parser.add_argument("--min-rps", nargs="*", metavar="ESCENARIO=LLAMADAS_S")
+    args = parser.parse_args()
+
+    proceso, base_url = iniciar_wttr_local(args)
+    try:
+        # Configuración antes de importar el agente: sin prefetch ni tope por minuto
+        os.environ["WTTR_BASE_URL"] = base_url
+        os.environ["WEATHER_PREFETCH_TOP_N"] = "0"
+        os.environ["WEATHER_UPSTREAM_BUDGET_PER_MIN"] = str(10**9)
+        os.environ["WEATHER_BREAKER_THRESHOLD"] = str(10**9)
+        sys.path.insert(0, DIRECTORIO)
+        import agent
+
+        resultados = asyncio.run(ejecutar(agent, args))
+    finally:
+        proceso.terminate()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+    fallos = revisar_regresiones(resultados, _umbrales(args.max_p95), _umbrales(args.min_rps))
+    for fallo in fallos:
+        print(f"REGRESIÓN: {fallo}")
+    sys.exit(1 if fallos else 0)
+
+
+if __name__ == "__main__":
+    main()
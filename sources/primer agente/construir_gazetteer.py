@@ -0,0 +1,113 @@
+"""
+Genera ciudades_tz.bin, el gazetteer offline que usa get_current_time.
+
+Entrada: un volcado de ciudades de GeoNames (https://download.geonames.org/export/dump/),
+por ejemplo cities1000.txt o cities1000.zip. Datos bajo licencia CC BY 4.0.
+
+Uso:
+    python construir_gazetteer.py cities1000.zip --min-poblacion 2000
+"""
+
+import argparse
+import io
+import os
+import zipfile
+
+from agent import GAZETTEER_HEADER, GAZETTEER_MAGIC, GAZETTEER_RECORD, _fold_name, _is_latin
+
+# Columnas del formato "geoname" de GeoNames
+COL_NOMBRE, COL_ASCII, COL_ALTERNATIVOS, COL_PAIS, COL_POBLACION, COL_ZONA = 1, 2, 3, 8, 14, 17
+
+MAX_BYTES_NOMBRE = 255
+
+
+def _abrir_volcado(ruta: str):
+    if ruta.endswith(".zip"):
+        archivo = zipfile.ZipFile(ruta)
+        interno = next(n for n in archivo.namelist() if n.endswith(".txt"))
+        return io.TextIOWrapper(archivo.open(interno), encoding="utf-8")
+    return open(ruta, encoding="utf-8")
+
+
+def _claves(columnas: list, con_alternativos: bool) -> set:
+    """Nombres normalizados por los que se podrá encontrar la ciudad."""
+    nombres = [columnas[COL_NOMBRE], columnas[COL_ASCII]]
+    if con_alternativos and columnas[COL_ALTERNATIVOS]:
+        nombres.extend(columnas[COL_ALTERNATIVOS].split(","))
+    claves = set()
+    for nombre in nombres:
+        clave = _fold_name(nombre)
+        # Solo alfabeto latino: las consultas en otras escrituras no se normalizan a ASCII
+        if clave and len(clave.encode("utf-8")) <= MAX_BYTES_NOMBRE and _is_latin(nombre):
+            claves.add(clave)
+    return claves
+
+
+def leer_ciudades(ruta: str, min_poblacion: int, alternativos_desde: int):
+    """Devuelve (clave, nombre, país, zona, población) por cada nombre de cada ciudad."""
+    filas = []
+    with _abrir_volcado(ruta) as volcado:
+        for linea in volcado:
+            columnas = linea.rstrip("\n").split("\t")
+            if len(columnas) <= COL_ZONA or not columnas[COL_ZONA]:
+                continue
+            poblacion = int(columnas[COL_POBLACION] or 0)
+            if poblacion < min_poblacion:
+                continue
+            nombre = columnas[COL_NOMBRE].encode("utf-8")[:MAX_BYTES_NOMBRE].decode("utf-8", "ignore")
+            pais = (columnas[COL_PAIS] or "--")[:2]
+            for clave in _claves(columnas, poblacion >= alternativos_desde):
+                filas.append((clave, nombre, pais, columnas[COL_ZONA], poblacion))
+    return filas
+
+
+def escribir_gazetteer(filas, salida: str) -> int:
+    """Escribe el archivo binario de forma atómica y devuelve el número de registros."""
+    filas.sort(key=lambda f: (f[0].encode("utf-8"), -f[4]))
+    zonas = sorted({f[3] for f in filas})
+    id_zona = {zona: i for i, zona in enumerate(zonas)}
+
+    bloque_zonas = b"".join(bytes([len(z)]) + z.encode("utf-8") for z in zonas)
+    claves = bytearray()
+    nombres = bytearray()
+    off_nombre = {}
+    registros = bytearray()
+    for clave, nombre, pais, zona, poblacion in filas:
+        clave_b = clave.encode("utf-8")
+        if nombre not in off_nombre:
+            off_nombre[nombre] = len(nombres)
+            nombres += nombre.encode("utf-8")
+        registros += GAZETTEER_RECORD.pack(
+            len(claves), off_nombre[nombre], min(poblacion, 2**32 - 1), id_zona[zona],
+            len(clave_b), len(nombre.encode("utf-8")), pais.encode("ascii", "replace"),
+        )
+        claves += clave_b
+
+    off_zonas = GAZETTEER_HEADER.size
+    off_registros = off_zonas + len(bloque_zonas)
+    off_claves = off_registros + len(registros)
+    off_nombres = off_claves + len(claves)
+    cabecera = GAZETTEER_HEADER.pack(
+        GAZETTEER_MAGIC, len(filas), len(zonas), off_zonas, off_registros, off_claves, off_nombres
+    )
+    temporal = salida + ".tmp"
+    with open(temporal, "wb") as f:
+        for parte in (cabecera, bloque_zonas, registros, claves, nombres):
+            f.write(parte)
+    os.replace(temporal, salida)
+    return len(filas)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construye el gazetteer binario de ciudades")
+    parser.add_argument("volcado", help="citiesNNNN.txt o .zip de GeoNames")
+    parser.add_argument("--salida", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "ciudades_tz.bin"))
+    parser.add_argument("--min-poblacion", type=int, default=2000)
+    parser.add_argument(
+        "--alternativos-desde", type=int, default=100000,
+        help="Población mínima para indexar también los nombres alternativos (Londres, Tokio...)",
+    )
+    args = parser.parse_args()
+    filas = leer_ciudades(args.volcado, args.min_poblacion, args.alternativos_desde)
+    total = escribir_gazetteer(filas, args.salida)
+    print(f"{total} registros escritos en {args.salida} ({os.path.getsize(args.salida) / 1e6:.1f} MB)")
@@ -0,0 +1,81 @@
+"""
+Prueba de carga de get_weather contra el wttr.in local (wttr_local.py).
+
+Simula N sesiones concurrentes en un mismo event loop, como ocurre en
+`adk web`/`adk api_server`, y compara la herramienta asíncrona del agente
+con la versión bloqueante original (petición síncrona sin pool).
+
+Uso:
+    python loadtest_clima.py --sesiones 100 --llamadas 5 --latencia 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import urllib.request
+
+from wttr_local import iniciar_servidor
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+async def _sesion(herramienta, indice: int, llamadas: int, latencias: list):
+    for n in range(llamadas):
+        inicio = time.perf_counter()
+        resultado = await herramienta(f"ciudad{indice}-{n}")
+        latencias.append(time.perf_counter() - inicio)
+        assert resultado["status"] == "success", resultado
+
+
+async def _medir(nombre: str, herramienta, sesiones: int, llamadas: int):
+    latencias = []
+    inicio = time.perf_counter()
+    await asyncio.gather(*(_sesion(herramienta, i, llamadas, latencias) for i in range(sesiones)))
+    duracion = time.perf_counter() - inicio
+    total = sesiones * llamadas
+    print(
+        f"{nombre:<12} {total:>6} llamadas en {duracion:7.2f}s | "
+        f"{total / duracion:8.1f} llamadas/s | "
+        f"p50 {statistics.median(latencias) * 1000:7.1f} ms | "
+        f"p95 {_percentil(latencias, 0.95) * 1000:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de get_weather")
+    parser.add_argument("--sesiones", type=int, default=100)
+    parser.add_argument("--llamadas", type=int, default=5, help="Llamadas por sesión")
+    parser.add_argument("--latencia", type=float, default=0.05, help="Latencia simulada de wttr.in (s)")
+    parser.add_argument("--sin-bloqueante", action="store_true", help="Omite la versión bloqueante")
+    args = parser.parse_args()
+
+    servidor = iniciar_servidor(latencia=args.latencia)
+    base_url = f"http://127.0.0.1:{servidor.server_address[1]}"
+    # Sin caché, prefetch ni tope por minuto: se mide el camino HTTP en cada llamada
+    os.environ["WTTR_BASE_URL"] = base_url
+    os.environ["WEATHER_CACHE_TTL"] = "0"
+    os.environ["WEATHER_CACHE_STALE_TTL"] = "0"
+    os.environ["WEATHER_PREFETCH_TOP_N"] = "0"
+    os.environ["WEATHER_UPSTREAM_BUDGET_PER_MIN"] = str(10**9)
+    import agent
+
+    async def get_weather_bloqueante(city: str) -> dict:
+        # Equivalente a la herramienta original: petición síncrona dentro del event loop
+        with urllib.request.urlopen(f"{base_url}/{city}?format=j1") as respuesta:
+            respuesta.read()
+        return {"status": "success"}
+
+    print(f"{args.sesiones} sesiones concurrentes, latencia simulada {args.latencia * 1000:.0f} ms")
+    if not args.sin_bloqueante:
+        asyncio.run(_medir("bloqueante", get_weather_bloqueante, args.sesiones, args.llamadas))
+    asyncio.run(_medir("async", agent.get_weather, args.sesiones, args.llamadas))
+    servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
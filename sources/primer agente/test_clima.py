@@ -0,0 +1,86 @@
+"""
+Pruebas de las claves por ciudad de get_weather (caché y coalescencia), sin red.
+
+Uso (desde este directorio):
+    python -m unittest test_clima
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("WEATHER_PREFETCH_TOP_N", "0")  # sin bucle de prefetch durante las pruebas
+import agent
+
+CIUDADES_NO_LATINAS = ["東京", "Москва", "القاهرة"]
+
+
+class PruebasClavesCiudad(unittest.TestCase):
+
+    def setUp(self):
+        agent.weather_cache.clear()
+        agent.unknown_city_cache.clear()
+        self.consultadas = []
+
+        async def condiciones_falsas(city, previous=None):
+            self.consultadas.append(city)
+            await asyncio.sleep(0.01)  # da tiempo a que las llamadas se solapen
+            return {"description": f"cielo de {city}", "temp_c": "20", "humidity": "50", "feels_like_c": "20"}
+
+        parche = mock.patch.object(agent, "_fetch_conditions", condiciones_falsas)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_nombres_no_latinos_no_comparten_clave(self):
+        claves = [agent._fold_name(ciudad) for ciudad in CIUDADES_NO_LATINAS]
+        self.assertTrue(all(claves))
+        self.assertEqual(len(set(claves)), len(claves))
+        self.assertEqual(agent._fold_name(" МОСКВА "), agent._fold_name("Москва"))
+        self.assertEqual(agent._fold_name("Bogotá."), "bogota")
+
+    def test_peticiones_concurrentes_no_se_coalescen(self):
+        async def consultar():
+            return await asyncio.gather(*(agent.get_weather(c) for c in CIUDADES_NO_LATINAS))
+
+        resultados = asyncio.run(consultar())
+        self.assertEqual(sorted(self.consultadas), sorted(CIUDADES_NO_LATINAS))
+        for ciudad, resultado in zip(CIUDADES_NO_LATINAS, resultados):
+            self.assertIn(f"cielo de {ciudad}", resultado["report"])
+
+    def test_cache_no_cruza_ciudades(self):
+        asyncio.run(agent.get_weather("東京"))
+        resultado = asyncio.run(agent.get_weather("Москва"))
+        self.assertEqual(self.consultadas, ["東京", "Москва"])
+        self.assertIn("cielo de Москва", resultado["report"])
+
+    def test_lote_acepta_nombres_no_latinos(self):
+        resultado = asyncio.run(agent.get_weather_many(["東京", "Москва", "москва"]))
+        self.assertEqual(resultado["status"], "success")
+        self.assertEqual(sorted(self.consultadas), ["Москва", "東京"])
+
+
+class PruebasSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        agent.weather_cache.clear()
+        agent.unknown_city_cache.clear()
+
+    def test_rechazos_no_cuentan_como_llamadas_ahorradas(self):
+        antes = agent.weather_flight.stats()
+        with mock.patch.object(agent.weather_breaker, "allow", return_value=False):
+            async def consultar():
+                return await asyncio.gather(*(agent.get_weather("Lima") for _ in range(5)))
+
+            resultados = asyncio.run(consultar())
+        despues = agent.weather_flight.stats()
+        self.assertTrue(all(r["status"] == "error" for r in resultados))
+        self.assertEqual(despues["rejected"] - antes["rejected"], 5)
+        self.assertEqual(despues["upstream_calls"], antes["upstream_calls"])
+        self.assertEqual(despues["coalesced"], antes["coalesced"])
+
+
+if __name__ == "__main__":
+    unittest.main()
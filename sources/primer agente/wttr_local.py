@@ -0,0 +1,198 @@
+"""
+Servidor local que imita a wttr.in para pruebas de carga sin salir a internet.
+
+Sirve las respuestas `format=j1` guardadas en grabaciones/<ciudad>.json; para
+cualquier otra ciudad reutiliza una grabación cambiando nombre y temperatura
+(o responde 404 con --solo-grabadas). También entiende `format=%C|%t|...`,
+ETag/If-None-Match y gzip, y puede inyectar latencia, errores 5xx y cuelgues.
+
+Uso:
+    python wttr_local.py --port 8765 --latencia 0.05 --jitter 0.02 --tasa-errores 0.05
+    WTTR_BASE_URL=http://127.0.0.1:8765 adk web
+
+    # Actualizar las grabaciones desde el wttr.in real (requiere red)
+    python wttr_local.py --grabar bogota madrid tokio
+"""
+
+import argparse
+import copy
+import gzip
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import unicodedata
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+DIRECTORIO_GRABACIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grabaciones")
+
+
+def _clave(ciudad: str) -> str:
+    sin_tildes = unicodedata.normalize("NFKD", ciudad).encode("ascii", "ignore").decode("ascii")
+    return " ".join(sin_tildes.lower().split())
+
+
+def cargar_grabaciones(directorio: str = DIRECTORIO_GRABACIONES) -> dict:
+    """Ciudad normalizada -> documento j1 grabado."""
+    grabaciones = {}
+    for nombre in sorted(os.listdir(directorio)):
+        if nombre.endswith(".json"):
+            with open(os.path.join(directorio, nombre), encoding="utf-8") as f:
+                grabaciones[_clave(nombre[:-5])] = json.load(f)
+    return grabaciones
+
+
+def grabar(ciudades: list, directorio: str = DIRECTORIO_GRABACIONES) -> None:
+    """Descarga respuestas j1 reales de wttr.in y las guarda como grabaciones."""
+    for ciudad in ciudades:
+        with urllib.request.urlopen(f"https://wttr.in/{quote(ciudad)}?format=j1", timeout=15) as respuesta:
+            documento = json.load(respuesta)
+        with open(os.path.join(directorio, f"{_clave(ciudad)}.json"), "w", encoding="utf-8") as f:
+            json.dump(documento, f, ensure_ascii=False, indent=1)
+        print(f"grabado {ciudad}")
+
+
+def _documento_para(ciudad: str, grabaciones: dict):
+    """Grabación de la ciudad o, si no hay, una plantilla adaptada de forma determinista."""
+    clave = _clave(ciudad)
+    if clave in grabaciones:
+        return grabaciones[clave]
+    plantillas = list(grabaciones.values())
+    semilla = sum(map(ord, clave))
+    documento = copy.deepcopy(plantillas[semilla % len(plantillas)])
+    actual = documento["current_condition"][0]
+    desplazamiento = semilla % 11 - 5
+    actual["temp_C"] = str(int(actual["temp_C"]) + desplazamiento)
+    actual["FeelsLikeC"] = str(int(actual["FeelsLikeC"]) + desplazamiento)
+    documento["nearest_area"][0]["areaName"][0]["value"] = ciudad
+    return documento
+
+
+def _formato_personalizado(formato: str, documento: dict) -> str:
+    """Sustituye los códigos %C %t %h %f como hace wttr.in con `format=...`."""
+    c = documento["current_condition"][0]
+    valores = {
+        "%C": c["weatherDesc"][0]["value"],
+        "%t": f"{int(c['temp_C']):+d}°C",
+        "%h": f"{c['humidity']}%",
+        "%f": f"{int(c['FeelsLikeC']):+d}°C",
+    }
+    for codigo, valor in valores.items():
+        formato = formato.replace(codigo, valor)
+    return formato + "\n"
+
+
+class WttrHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, igual que el servicio real
+    disable_nagle_algorithm = True  # cabeceras y cuerpo van en escrituras separadas
+    # Se sobrescriben por servidor en iniciar_servidor()
+    grabaciones = {}
+    latencia = 0.0
+    jitter = 0.0
+    tasa_errores = 0.0
+    tasa_cuelgues = 0.0
+    duracion_cuelgue = 30.0
+    solo_grabadas = False
+
+    def do_GET(self):
+        azar = random.random()
+        if azar < self.tasa_cuelgues:
+            time.sleep(self.duracion_cuelgue)  # provoca el timeout de lectura del cliente
+        if self.latencia or self.jitter:
+            time.sleep(max(0.0, self.latencia + random.uniform(-self.jitter, self.jitter)))
+        if self.tasa_cuelgues <= azar < self.tasa_cuelgues + self.tasa_errores:
+            self._responder(b"Internal Server Error", "text/plain", estado=503)
+            return
+
+        url = urlsplit(self.path)
+        ciudad = unquote(url.path.strip("/")) or "bogota"
+        formato = parse_qs(url.query).get("format", ["j1"])[0]
+        if self.solo_grabadas and _clave(ciudad) not in self.grabaciones:
+            self._responder(f"Unknown location; please try ~{ciudad}\n".encode("utf-8"), "text/plain", estado=404)
+            return
+        documento = _documento_para(ciudad, self.grabaciones)
+        if formato == "j1":
+            cuerpo, tipo = json.dumps(documento, indent=1).encode("utf-8"), "application/json"
+        else:
+            cuerpo, tipo = _formato_personalizado(formato, documento).encode("utf-8"), "text/plain; charset=utf-8"
+        self._responder(cuerpo, tipo)
+
+    def _responder(self, cuerpo: bytes, tipo: str, estado: int = 200):
+        etag = '"' + hashlib.md5(cuerpo).hexdigest() + '"'
+        if estado == 200 and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        if estado == 200:
+            self.send_header("ETag", etag)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            cuerpo = gzip.compress(cuerpo)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WttrServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # aguanta ráfagas de conexiones de cientos de sesiones
+
+    def handle_error(self, request, client_address):
+        # Clientes que cierran la conexión antes de tiempo (timeouts, lectura parcial de j1)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def iniciar_servidor(port: int = 0, latencia: float = 0.0, jitter: float = 0.0,
+                     tasa_errores: float = 0.0, tasa_cuelgues: float = 0.0,
+                     duracion_cuelgue: float = 30.0, solo_grabadas: bool = False) -> WttrServer:
+    """Arranca el servidor en un hilo y lo devuelve; `server.server_address` tiene el puerto real."""
+    handler = type("WttrHandlerConfigurado", (WttrHandler,), {
+        "grabaciones": cargar_grabaciones(),
+        "latencia": latencia,
+        "jitter": jitter,
+        "tasa_errores": tasa_errores,
+        "tasa_cuelgues": tasa_cuelgues,
+        "duracion_cuelgue": duracion_cuelgue,
+        "solo_grabadas": solo_grabadas,
+    })
+    servidor = WttrServer(("127.0.0.1", port), handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Imitación local de wttr.in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latencia", type=float, default=0.05, help="Segundos de espera por petición")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variación aleatoria (+/- s) de la latencia")
+    parser.add_argument("--tasa-errores", type=float, default=0.0, help="Fracción de respuestas 503")
+    parser.add_argument("--tasa-cuelgues", type=float, default=0.0, help="Fracción de peticiones que no responden")
+    parser.add_argument("--duracion-cuelgue", type=float, default=30.0)
+    parser.add_argument("--solo-grabadas", action="store_true", help="404 para ciudades sin grabación")
+    parser.add_argument("--grabar", nargs="+", metavar="CIUDAD", help="Graba respuestas reales y termina")
+    args = parser.parse_args()
+    if args.grabar:
+        grabar(args.grabar)
+        raise SystemExit(0)
+    servidor = iniciar_servidor(
+        args.port, args.latencia, args.jitter, args.tasa_errores,
+        args.tasa_cuelgues, args.duracion_cuelgue, args.solo_grabadas,
+    )
+    print(f"wttr.in local escuchando en http://127.0.0.1:{servidor.server_address[1]}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()